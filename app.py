@@ -1,115 +1,505 @@
-from typing import List
+import logging
+import os
+import time
+from typing import List, Optional, Tuple
 
 import uvicorn
-from fastapi import Depends, FastAPI, HTTPException, Query
-from sqlmodel import Session, SQLModel, create_engine, select
-
-from models import Hero, HeroCreate, HeroRead, HeroReadWithTeam, HeroUpdate, Team, TeamCreate, TeamRead, TeamReadWithHeroes, TeamUpdate
-
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import delete, select as sa_select, update
+from sqlalchemy.pool import QueuePool
+from sqlmodel import Session, col, select
+
+from models import (
+    AppModel, Hero, HeroBatchResult, HeroBatchUpdate, HeroCreate, HeroRead, HeroReadWithTeam, HeroUpdate, Team, TeamCreate, TeamRead,
+    TeamReadWithHeroes, TeamStats, TeamStatsRead, TeamUpdate,
+)
+from queries import (
+    HERO_BY_ID, HERO_ROW_COLUMNS, HERO_ROWS_PAGE, HERO_VERSION, HEROES_PAGE, TEAM_BY_ID, TEAM_ROWS_PAGE, TEAM_VERSION, TEAMS_PAGE,
+    WARM_UP_READS, WARM_UP_WRITES, filter_heroes,
+)
+from project.advisor import ensure_indexes
+from project.bulk import DEFAULT_BATCH_SIZE, MAX_PARAMETERS, batched, bulk_insert, bulk_update, insert_row
+from project.cache import EntityCache
+from project.coalescer import WriteCoalescer
+from project.counting import COUNT_MARGIN_HEADER, TOTAL_COUNT_HEADER, estimate_count
+from project.database import create_db_engine, pool_stats
+from project.etag import bump_versions, collection_etag, entity_etag, etag_matches, not_modified
+from project.export import DEFAULT_EXPORT_BATCH_SIZE, NDJSON_MEDIA_TYPE, export_columns, iter_ndjson
+from project.instrumentation import RequestMetrics, instrument_engine, sql_metrics_middleware, track_statement_cache
+from project.pagination import CURSOR_HEADER, next_cursor, page_params, paginate, prebuilt_page
+from project.serialization import FastJSONResponse, dump_model, dumps
+from project.startup import add_autoincrement, add_missing_columns, ensure_schema, update_statistics, warm_up
+from stats import create_maintained_tables, read_row_count, record_hero_change, record_hero_changes, stats_read, stats_statement
+
+
+# Startup timings are measured from here, the import of the app.
+imported_at = time.perf_counter()
+logger = logging.getLogger('uvicorn.error')
 
 sqlite_file_name = "database.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, echo=True, connect_args=connect_args)
+# SQLite takes one writer at a time: writes queue for the single connection of write_engine
+# instead of for the file lock, and reads go to a pool of read-only connections so a batch
+# of writes doesn't hold them up (in WAL mode readers never wait for the writer).
+write_engine = create_db_engine(sqlite_url, poolclass=QueuePool, pool_size=1, max_overflow=0)
+read_engine = create_db_engine(
+    sqlite_url, read_only=True, poolclass=QueuePool, pool_size=int(os.environ.get('DB_READ_POOL_SIZE', 5)), max_overflow=10
+)
+instrument_engine(write_engine)
+instrument_engine(read_engine)
+statement_caches = {'read': track_statement_cache(read_engine), 'write': track_statement_cache(write_engine)}
+
+READ_METHODS = {'GET', 'HEAD'}
+
+
+def create_tables(conn):
+    add_missing_columns(conn, AppModel.metadata)
+    add_autoincrement(conn, AppModel.metadata)
+    create_maintained_tables(conn)
+    AppModel.metadata.create_all(conn)
+    ensure_indexes(conn, AppModel.metadata)
+
 
+def create_db_and_tables() -> bool:
+    # The DDL only runs when the models changed since the database was last set up, the
+    # planner statistics are refreshed on every boot.
+    with write_engine.begin() as conn:
+        created = ensure_schema(conn, AppModel.metadata, create_tables)
+        update_statistics(conn)
+        return created
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
 
+# WARM_UP=0 skips the warm-up, the first requests then configure the mappers, open the
+# connections and compile the statements.
+warm_up_enabled = os.environ.get('WARM_UP', '1') == '1'
+startup_timings = {}
+
+
+# RESPONSE_MODE=validated sends hero/team reads through FastAPI's response_model validation
+# and jsonable_encoder, the default "fast" mode dumps the DB rows directly.
+fast_responses = os.environ.get('RESPONSE_MODE', 'fast') == 'fast'
+# LIST_MODE=rows (the default) has GET /heroes/ and /teams/ select only the columns they
+# return, as plain rows; LIST_MODE=entities loads full Hero/Team objects into the session.
+list_rows = os.environ.get('LIST_MODE', 'rows') == 'rows'
 
 app = FastAPI()
 
+# Every response carries X-DB-Queries, X-DB-Time-ms and X-DB-Rows; GET /metrics has the per-route histograms.
+request_metrics = RequestMetrics()
+app.middleware('http')(sql_metrics_middleware(request_metrics))
+
+# Serialized HeroReadWithTeam / TeamReadWithHeroes bodies, keyed by ('hero', id) and ('team', id).
+entity_cache = EntityCache(
+    maxsize=int(os.environ.get('CACHE_SIZE', 10_000)),
+    ttl=float(os.environ.get('CACHE_TTL', 30)),
+)
+
+# WRITE_MODE=coalesced sends create_hero/update_hero through one writer thread that commits
+# the operations queued within WRITE_BATCH_WAIT_MS of each other in a single transaction.
+write_coalescer = WriteCoalescer(
+    write_engine,
+    max_batch_size=int(os.environ.get('WRITE_BATCH_SIZE', 100)),
+    max_wait=float(os.environ.get('WRITE_BATCH_WAIT_MS', 2)) / 1000,
+) if os.environ.get('WRITE_MODE', 'direct') == 'coalesced' else None
+
 
 @app.on_event("startup")
 def on_startup():
-    create_db_and_tables()
+    start = time.perf_counter()
+    schema_created = create_db_and_tables()
+    schema_done = time.perf_counter()
+    if warm_up_enabled:
+        warm_up(read_engine, WARM_UP_READS)
+        warm_up(write_engine, WARM_UP_WRITES)
+    ready = time.perf_counter()
+    startup_timings.update(
+        schema_created=schema_created,
+        schema_ms=(schema_done - start) * 1000,
+        warm_up_ms=(ready - schema_done) * 1000 if warm_up_enabled else None,
+        ready_ms=(ready - imported_at) * 1000,
+    )
+    if write_coalescer is not None:
+        write_coalescer.start()
+    logger.info('Ready %.1fms after import: %s', startup_timings['ready_ms'], startup_timings)
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    if write_coalescer is not None:
+        write_coalescer.stop()
+
+
+def get_session(request: Request):
+    # Routes by method, so every GET endpoint reads from read_engine without declaring it.
+    with Session(read_engine if request.method in READ_METHODS else write_engine) as session:
+        yield session
 
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+def run_write(session: Session, operation):
+    # The operation writes without committing: either the coalescer commits it with its
+    # batch, or it runs on the request's session and is committed here.
+    if write_coalescer is not None:
+        return write_coalescer.run(operation)
+    result = operation(session)
+    session.commit()
+    return result
+
+
+def insert_hero(session: Session, hero: HeroCreate) -> int:
+    hero_id = insert_row(session, Hero, hero.dict())
+    record_hero_change(session, None, (hero.team_id, hero.age))
+    bump_versions(session, Team, [hero.team_id])
+    return hero_id
 
 
 @app.post("/heroes/", response_model=HeroRead)
 def create_hero(*, session: Session = Depends(get_session), hero: HeroCreate):
-    # The alternative for Hero.from_orm() is Hero.parse_obj() that reads data from a dictionary.
-    db_hero = Hero.from_orm(hero)
-    session.add(db_hero)
-    session.commit()
-    session.refresh(db_hero)
-    return db_hero
+    # The response is the input plus the new id, the columns left out of HeroRead are the only ones with defaults.
+    hero_id = run_write(session, lambda write_session: insert_hero(write_session, hero))
+    if hero.team_id is not None:
+        entity_cache.invalidate(('team', hero.team_id))
+    return HeroRead(id=hero_id, **hero.dict())
 
 
-@app.get("/heroes/", response_model=List[Hero])
-def read_heroes(*, session: Session = Depends(get_session), offset: int = 0, limit: int = Query(default=100, lte=100)):
-    # heroes = session.exec(select(Hero)).all()
-    heroes = session.exec(select(Hero).offset(offset).limit(limit)).all()
+@app.post("/heroes/bulk", response_model=List[int])
+def create_heroes(
+    *,
+    session: Session = Depends(get_session),
+    heroes: List[HeroCreate],
+    batch_size: int = Query(default=DEFAULT_BATCH_SIZE, gt=0)
+):
+    # All the heroes are inserted in one transaction: either every row is created or none is.
+    try:
+        ids = bulk_insert(session, Hero, [hero.dict() for hero in heroes], batch_size=batch_size)
+        record_hero_changes(session, [(None, (hero.team_id, hero.age)) for hero in heroes])
+        bump_versions(session, Team, [hero.team_id for hero in heroes])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    entity_cache.invalidate(*{('team', hero.team_id) for hero in heroes if hero.team_id is not None})
+    return ids
+
 
+@app.patch("/heroes/", response_model=List[HeroBatchResult])
+def update_heroes(
+    *,
+    session: Session = Depends(get_session),
+    heroes: List[HeroBatchUpdate],
+    batch_size: int = Query(default=DEFAULT_BATCH_SIZE, gt=0)
+):
+    # Later entries for the same id win, as if the PATCHes had been sent one after another.
+    changes = {}
+    for hero in heroes:
+        changes.setdefault(hero.id, {}).update(hero.dict(exclude_unset=True))
+    # One SELECT per batch of ids finds the missing heroes and the (team_id, age) the stats need,
+    # without loading ORM objects.
+    found = {}
+    for ids in batched(changes, MAX_PARAMETERS):
+        statement = select(Hero.id, Hero.team_id, Hero.age).where(col(Hero.id).in_(ids))
+        found.update((hero_id, (team_id, age)) for hero_id, team_id, age in session.execute(statement))
+    updates = [changes[hero_id] for hero_id in changes if hero_id in found]
+    after = {row['id']: (row.get('team_id', found[row['id']][0]), row.get('age', found[row['id']][1])) for row in updates}
+    try:
+        bulk_update(session, Hero, updates, batch_size=batch_size)
+        record_hero_changes(session, [(found[hero_id], after[hero_id]) for hero_id in after])
+        bump_versions(session, Hero, after)
+        bump_versions(session, Team, [found[hero_id][0] for hero_id in after] + [team_id for team_id, _ in after.values()])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    invalidated = set()
+    for hero_id, (team_id, _) in after.items():
+        invalidated.update({('hero', hero_id), ('team', found[hero_id][0]), ('team', team_id)})
+    entity_cache.invalidate(*invalidated)
+    return [
+        HeroBatchResult(id=hero_id, ok=True) if hero_id in found else HeroBatchResult(id=hero_id, ok=False, detail='Hero not found!')
+        for hero_id in changes
+    ]
+
+
+@app.get("/heroes/", response_model=List[HeroRead])
+def read_heroes(
+    *,
+    session: Session = Depends(get_session),
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    offset: int = 0,
+    limit: int = Query(default=100, lte=100),
+    after: Optional[str] = None,
+    count: bool = False,
+    min_age: Optional[int] = None,
+    max_age: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+    team_id: Optional[int] = None,
+    headquarters: Optional[str] = None
+):
+    # heroes = session.exec(select(Hero)).all()
+    # Pass the X-Next-Cursor header of the previous page as `after` to page by id instead of offset.
+    # count=true adds X-Total-Count: the maintained row count, or an estimate for a filtered list.
+    filters = dict(min_age=min_age, max_age=max_age, name_prefix=name_prefix, team_id=team_id, headquarters=headquarters)
+    filtered = any(value is not None for value in filters.values())
+    try:
+        params = page_params(after=after, offset=offset, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor!')
+    if filtered:
+        # SQLAlchemy's select() rather than SQLModel's, so the compiled SQL is cached (see queries.py).
+        selected = sa_select(*HERO_ROW_COLUMNS) if list_rows else sa_select(Hero)
+        statement = prebuilt_page(filter_heroes(selected, **filters), Hero.id)
+    else:
+        # The unfiltered list is the hot path, it runs the prebuilt statement.
+        statement = HERO_ROWS_PAGE if list_rows else HEROES_PAGE
+    result = session.execute(statement, params)
+    heroes = result.all() if list_rows else result.scalars().all()
+    cursor = next_cursor(heroes, limit)
+    if cursor:
+        response.headers[CURSOR_HEADER] = cursor
+    if count:
+        total = read_row_count(session, Hero)
+        if filtered:
+            total, margin = estimate_count(session, filter_heroes(sa_select(Hero.id), **filters), Hero.id, total)
+            if margin:
+                response.headers[COUNT_MARGIN_HEADER] = str(margin)
+        response.headers[TOTAL_COUNT_HEADER] = str(total)
+    etag = collection_etag(heroes)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, dict(response.headers))
+    response.headers['ETag'] = etag
+    if fast_responses:
+        return FastJSONResponse([dump_model(hero, HeroRead) for hero in heroes], headers=dict(response.headers))
     return heroes
 
 
+@app.get("/heroes/export")
+def export_heroes(
+    *,
+    session: Session = Depends(get_session),
+    fields: Optional[str] = None,
+    min_age: Optional[int] = None,
+    max_age: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+    team_id: Optional[int] = None,
+    headquarters: Optional[str] = None,
+    batch_size: int = Query(default=DEFAULT_EXPORT_BATCH_SIZE, gt=0)
+):
+    # One HeroRead object per line, streamed straight from the cursor.
+    try:
+        columns = export_columns(Hero.__table__, fields, list(HeroRead.__fields__))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    statement = filter_heroes(
+        select(*columns),
+        min_age=min_age,
+        max_age=max_age,
+        name_prefix=name_prefix,
+        team_id=team_id,
+        headquarters=headquarters,
+    ).order_by(Hero.id)
+    return StreamingResponse(iter_ndjson(session, statement, batch_size=batch_size), media_type=NDJSON_MEDIA_TYPE)
+
+
 @app.get("/heroes/{hero_id}", response_model=HeroReadWithTeam)
-def read_hero(*, session: Session = Depends(get_session), hero_id: int):
-    hero = session.get(Hero, hero_id)
-    if not hero:
-        raise HTTPException(status_code=404, detail='Hero not found!')
-    return hero
+def read_hero(*, session: Session = Depends(get_session), hero_id: int, if_none_match: Optional[str] = Header(None)):
+    # Cached bodies are sent as they are, without touching the database or Pydantic.
+    cached = entity_cache.get(('hero', hero_id))
+    if cached is None and if_none_match:
+        # A poll for an unchanged hero is answered from the versions alone.
+        versions = session.execute(HERO_VERSION, {'hero_id': hero_id}).first()
+        if not versions:
+            raise HTTPException(status_code=404, detail='Hero not found!')
+        if etag_matches(if_none_match, entity_etag(*versions)):
+            return not_modified(entity_etag(*versions))
+    if cached is None:
+        generation = entity_cache.generation
+        hero = session.execute(HERO_BY_ID, {'hero_id': hero_id}).scalars().first()
+        if not hero:
+            raise HTTPException(status_code=404, detail='Hero not found!')
+        body = dumps(dump_model(hero, HeroReadWithTeam)) if fast_responses else HeroReadWithTeam.from_orm(hero).json()
+        cached = (body, entity_etag(hero.version, hero.team.version if hero.team else None))
+        depends_on = [('team', hero.team_id)] if hero.team_id is not None else []
+        entity_cache.set(('hero', hero_id), cached, depends_on=depends_on, generation=generation)
+    body, etag = cached
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return Response(content=body, media_type='application/json', headers={'ETag': etag})
 
 
 @app.patch("/heroes/{hero_id}", response_model=HeroRead)
 def update_hero(*, session: Session = Depends(get_session), hero_id: int, hero: HeroUpdate):
+    updated = run_write(session, lambda write_session: apply_hero_update(write_session, hero_id, hero))
+    if updated is None:
+        raise HTTPException(status_code=404, detail='Hero not found!')
+    db_hero, old_team_id = updated
+    # The hero is embedded in the team it left and in the team it joined.
+    entity_cache.invalidate(('hero', hero_id), ('team', old_team_id), ('team', db_hero.team_id))
+    return db_hero
+
+
+def apply_hero_update(session: Session, hero_id: int, hero: HeroUpdate) -> Optional[Tuple[HeroRead, Optional[int]]]:
+    # Returns the updated hero and the team it was in, or None when it doesn't exist. The
+    # HeroRead is taken before the commit, the session may be gone by the time it's sent.
     db_hero = session.get(Hero, hero_id)
     if not db_hero:
-        raise HTTPException(status_code=404, detail='Hero not found!')
+        return None
+    old_team_id = db_hero.team_id
+    before = (db_hero.team_id, db_hero.age)
     hero_data = hero.dict(exclude_unset=True)
     for key, value in hero_data.items():
         setattr(db_hero, key, value)
+    # In SQL: the read above takes no lock, two workers must not write the same version.
+    db_hero.version = Hero.version + 1
     session.add(db_hero)
-    session.commit()
-    session.refresh(db_hero)
-    return db_hero
+    session.flush()
+    record_hero_change(session, before, (db_hero.team_id, db_hero.age))
+    bump_versions(session, Team, [old_team_id, db_hero.team_id])
+    return HeroRead.from_orm(db_hero), old_team_id
 
 
 @app.delete("/heroes/{hero_id}")
 def delete_hero(*, session: Session = Depends(get_session), hero_id: int):
-    with Session(engine) as session:
-        hero = session.get(Hero, hero_id)
-        if not hero:
-            raise HTTPException(status_code=404, detail='Hero not found!')
-        session.delete(hero)
-        session.commit()
-        return {"ok": True}
+    hero = session.get(Hero, hero_id)
+    if not hero:
+        raise HTTPException(status_code=404, detail='Hero not found!')
+    team_id = hero.team_id
+    session.delete(hero)
+    session.flush()
+    record_hero_change(session, (team_id, hero.age), None)
+    bump_versions(session, Team, [team_id])
+    session.commit()
+    entity_cache.invalidate(('hero', hero_id), ('team', team_id))
+    return {"ok": True}
 
 
 @app.get("/teams/", response_model=List[TeamRead])
 def read_teams(
     *,
     session: Session = Depends(get_session),
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     offset: int = 0,
-    limit: int = Query(default=100, lte=100)
+    limit: int = Query(default=100, lte=100),
+    after: Optional[str] = None,
+    count: bool = False
 ):
-    teams = session.exec(
-        select(Team).offset(offset).limit(limit)
-    ).all()
+    try:
+        params = page_params(after=after, offset=offset, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor!')
+    if list_rows:
+        teams = session.execute(TEAM_ROWS_PAGE, params).all()
+    else:
+        teams = session.execute(TEAMS_PAGE, params).scalars().all()
+    cursor = next_cursor(teams, limit)
+    if cursor:
+        response.headers[CURSOR_HEADER] = cursor
+    if count:
+        response.headers[TOTAL_COUNT_HEADER] = str(read_row_count(session, Team))
+    etag = collection_etag(teams)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, dict(response.headers))
+    response.headers['ETag'] = etag
+    if fast_responses:
+        return FastJSONResponse([dump_model(team, TeamRead) for team in teams], headers=dict(response.headers))
     return teams
 
 
 @app.post("/teams/", response_model=TeamRead)
 def create_team(*, session: Session = Depends(get_session), team: TeamCreate):
-    db_team = Team.from_orm(team)
-    session.add(db_team)
+    team_data = team.dict()
+    team_id = insert_row(session, Team, team_data)
     session.commit()
-    session.refresh(db_team)
-    return db_team
+    return TeamRead(id=team_id, **team_data)
 
 
-@app.get("/teams/{team_id}", response_model=TeamReadWithHeroes)
-def read_team(*, session: Session = Depends(get_session), team_id: int):
-    team = session.get(Team, team_id)
-    if not team:
+@app.post("/teams/bulk", response_model=List[int])
+def create_teams(
+    *,
+    session: Session = Depends(get_session),
+    teams: List[TeamCreate],
+    batch_size: int = Query(default=DEFAULT_BATCH_SIZE, gt=0)
+):
+    try:
+        ids = bulk_insert(session, Team, [team.dict() for team in teams], batch_size=batch_size)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return ids
+
+
+@app.get("/teams/export")
+def export_teams(
+    *,
+    session: Session = Depends(get_session),
+    fields: Optional[str] = None,
+    headquarters: Optional[str] = None,
+    batch_size: int = Query(default=DEFAULT_EXPORT_BATCH_SIZE, gt=0)
+):
+    try:
+        columns = export_columns(Team.__table__, fields, list(TeamRead.__fields__))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    statement = select(*columns).order_by(Team.id)
+    if headquarters is not None:
+        statement = statement.where(Team.headquarters == headquarters)
+    return StreamingResponse(iter_ndjson(session, statement, batch_size=batch_size), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.get("/teams/stats", response_model=List[TeamStatsRead])
+def read_teams_stats(
+    *,
+    session: Session = Depends(get_session),
+    response: Response,
+    offset: int = 0,
+    limit: int = Query(default=100, lte=100),
+    after: Optional[str] = None
+):
+    # One primary key lookup in teamstats per team, whatever the size of the teams.
+    try:
+        statement = paginate(stats_statement(), Team.id, after=after, offset=offset, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor!')
+    stats = [stats_read(row) for row in session.execute(statement)]
+    cursor = next_cursor(stats, limit, key='team_id')
+    if cursor:
+        response.headers[CURSOR_HEADER] = cursor
+    return stats
+
+
+@app.get("/teams/{team_id}/stats", response_model=TeamStatsRead)
+def read_team_stats(*, session: Session = Depends(get_session), team_id: int):
+    row = session.execute(stats_statement().where(Team.id == team_id)).first()
+    if not row:
         raise HTTPException(status_code=404, detail='Team not found!')
-    return team
+    return stats_read(row)
+
+
+@app.get("/teams/{team_id}", response_model=TeamReadWithHeroes)
+def read_team(*, session: Session = Depends(get_session), team_id: int, if_none_match: Optional[str] = Header(None)):
+    cached = entity_cache.get(('team', team_id))
+    if cached is None and if_none_match:
+        # Hero writes bump the version of their teams, so it covers the embedded heroes too.
+        version = session.execute(TEAM_VERSION, {'team_id': team_id}).scalar()
+        if version is None:
+            raise HTTPException(status_code=404, detail='Team not found!')
+        if etag_matches(if_none_match, entity_etag(version)):
+            return not_modified(entity_etag(version))
+    if cached is None:
+        generation = entity_cache.generation
+        team = session.execute(TEAM_BY_ID, {'team_id': team_id}).scalars().first()
+        if not team:
+            raise HTTPException(status_code=404, detail='Team not found!')
+        body = dumps(dump_model(team, TeamReadWithHeroes)) if fast_responses else TeamReadWithHeroes.from_orm(team).json()
+        cached = (body, entity_etag(team.version))
+        entity_cache.set(('team', team_id), cached, depends_on=[('hero', hero.id) for hero in team.heroes], generation=generation)
+    body, etag = cached
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return Response(content=body, media_type='application/json', headers={'ETag': etag})
 
 
 @app.patch("/teams/{team_id}", response_model=TeamRead)
@@ -125,21 +515,63 @@ def update_team(
     team_data = team.dict(exclude_unset=True)
     for key, value in team_data.items():
         setattr(db_team, key, value)
+    # In SQL: the read above takes no lock, two workers must not write the same version.
+    db_team.version = Team.version + 1
     session.add(db_team)
     session.commit()
     session.refresh(db_team)
+    # Also drops the cached heroes of the team, they embed it.
+    entity_cache.invalidate(('team', team_id))
     return db_team
 
 
 @app.delete("/teams/{team_id}")
 def delete_team(*, session: Session = Depends(get_session), team_id: int):
-    team = session.get(Team, team_id)
-    if not team:
+    # Set based: session.delete(team) would load every hero of the team and null their team_id
+    # one row at a time. Their versions move too, team_id is part of the hero list bodies.
+    session.execute(
+        update(Hero.__table__).where(Hero.team_id == team_id).values(team_id=None, version=Hero.version + 1)
+    )
+    if not session.execute(delete(Team.__table__).where(Team.id == team_id)).rowcount:
+        session.rollback()
         raise HTTPException(status_code=404, detail='Team not found!')
-    session.delete(team)
+    # The team's heroes are detached from it above, so there is nothing left to count.
+    session.execute(delete(TeamStats.__table__).where(TeamStats.team_id == team_id))
     session.commit()
+    entity_cache.invalidate(('team', team_id))
     return {'ok': True}
 
 
+@app.get("/cache/stats")
+def read_cache_stats():
+    return entity_cache.stats()
+
+
+@app.get("/cache/statements")
+def read_statement_cache_stats():
+    return {name: cache.stats() for name, cache in statement_caches.items()}
+
+
+@app.get("/startup/stats")
+def read_startup_stats():
+    first_request_at = request_metrics.first_request_at
+    first_request_ms = (first_request_at - imported_at) * 1000 if first_request_at is not None else None
+    return {**startup_timings, 'first_request_ms': first_request_ms}
+
+
+@app.get("/pool/stats")
+def read_pool_stats():
+    return {'read': pool_stats(read_engine), 'write': pool_stats(write_engine)}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return request_metrics.render() + (write_coalescer.render() if write_coalescer is not None else '')
+
+
 if __name__ == '__main__':
-    uvicorn.run(app, debug=True)
+    # DB_MODE=async serves the same endpoints from app_async.py, on an aiosqlite engine.
+    if os.environ.get('DB_MODE', 'sync') == 'async':
+        uvicorn.run('app_async:app')
+    else:
+        uvicorn.run(app, debug=True)
@@ -0,0 +1,204 @@
+from typing import List, Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
+from sqlalchemy import delete, insert, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import (
+    AppModel, Hero, HeroCreate, HeroRead, HeroReadWithTeam, HeroUpdate, Team, TeamCreate, TeamRead, TeamReadWithHeroes, TeamStats,
+    TeamUpdate,
+)
+from queries import HERO_BY_ID, HERO_ROWS_PAGE, TEAM_BY_ID, TEAM_ROWS_PAGE
+from project.advisor import ensure_indexes
+from project.counting import TOTAL_COUNT_HEADER
+from project.database import create_async_db_engine
+from project.etag import bump_versions
+from project.pagination import CURSOR_HEADER, next_cursor, page_params
+from project.startup import add_autoincrement, add_missing_columns, ensure_schema
+from stats import create_maintained_tables, read_row_count, record_hero_change
+
+
+# Same CRUD endpoints as app.py, served by `async def` handlers on an aiosqlite engine so
+# requests don't hold a threadpool slot while they wait on the database.
+# Run it with `DB_MODE=async python app.py` or `uvicorn app_async:app`.
+sqlite_file_name = "database.db"
+sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
+
+engine = create_async_db_engine(sqlite_url)
+
+
+def create_tables(conn):
+    add_missing_columns(conn, AppModel.metadata)
+    add_autoincrement(conn, AppModel.metadata)
+    create_maintained_tables(conn)
+    AppModel.metadata.create_all(conn)
+    ensure_indexes(conn, AppModel.metadata)
+
+
+async def create_db_and_tables():
+    # Skips the DDL when the stored schema version matches the models, like app.py.
+    async with engine.begin() as conn:
+        return await conn.run_sync(ensure_schema, AppModel.metadata, create_tables)
+
+
+app = FastAPI()
+
+
+@app.on_event("startup")
+async def on_startup():
+    await create_db_and_tables()
+
+
+async def get_session():
+    async with AsyncSession(engine) as session:
+        yield session
+
+
+@app.post("/heroes/", response_model=HeroRead)
+async def create_hero(*, session: AsyncSession = Depends(get_session), hero: HeroCreate):
+    hero_data = hero.dict()
+    result = await session.execute(insert(Hero.__table__), hero_data)
+    # The team stats are kept by the same functions as app.py, on the session's sync side.
+    await session.run_sync(record_hero_change, None, (hero.team_id, hero.age))
+    await session.run_sync(bump_versions, Team, [hero.team_id])
+    await session.commit()
+    return HeroRead(id=result.inserted_primary_key[0], **hero_data)
+
+
+@app.get("/heroes/", response_model=List[HeroRead])
+async def read_heroes(
+    *,
+    session: AsyncSession = Depends(get_session),
+    response: Response,
+    offset: int = 0,
+    limit: int = Query(default=100, lte=100),
+    after: Optional[str] = None,
+    count: bool = False
+):
+    try:
+        params = page_params(after=after, offset=offset, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor!')
+    heroes = (await session.execute(HERO_ROWS_PAGE, params)).all()
+    cursor = next_cursor(heroes, limit)
+    if cursor:
+        response.headers[CURSOR_HEADER] = cursor
+    if count:
+        response.headers[TOTAL_COUNT_HEADER] = str(await session.run_sync(read_row_count, Hero))
+    return heroes
+
+
+@app.get("/heroes/{hero_id}", response_model=HeroReadWithTeam)
+async def read_hero(*, session: AsyncSession = Depends(get_session), hero_id: int):
+    # Lazy loads can't run outside the session's greenlet, HERO_BY_ID's eager options are required here.
+    hero = (await session.execute(HERO_BY_ID, {'hero_id': hero_id})).scalars().first()
+    if not hero:
+        raise HTTPException(status_code=404, detail='Hero not found!')
+    return hero
+
+
+@app.patch("/heroes/{hero_id}", response_model=HeroRead)
+async def update_hero(*, session: AsyncSession = Depends(get_session), hero_id: int, hero: HeroUpdate):
+    db_hero = await session.get(Hero, hero_id)
+    if not db_hero:
+        raise HTTPException(status_code=404, detail='Hero not found!')
+    before = (db_hero.team_id, db_hero.age)
+    hero_data = hero.dict(exclude_unset=True)
+    for key, value in hero_data.items():
+        setattr(db_hero, key, value)
+    # In SQL: concurrent requests aren't serialized, two of them must not write the same version.
+    db_hero.version = Hero.version + 1
+    session.add(db_hero)
+    await session.flush()
+    await session.run_sync(record_hero_change, before, (db_hero.team_id, db_hero.age))
+    await session.run_sync(bump_versions, Team, [before[0], db_hero.team_id])
+    await session.commit()
+    await session.refresh(db_hero)
+    return db_hero
+
+
+@app.delete("/heroes/{hero_id}")
+async def delete_hero(*, session: AsyncSession = Depends(get_session), hero_id: int):
+    hero = await session.get(Hero, hero_id)
+    if not hero:
+        raise HTTPException(status_code=404, detail='Hero not found!')
+    before = (hero.team_id, hero.age)
+    await session.delete(hero)
+    await session.flush()
+    await session.run_sync(record_hero_change, before, None)
+    await session.run_sync(bump_versions, Team, [before[0]])
+    await session.commit()
+    return {"ok": True}
+
+
+@app.get("/teams/", response_model=List[TeamRead])
+async def read_teams(
+    *,
+    session: AsyncSession = Depends(get_session),
+    response: Response,
+    offset: int = 0,
+    limit: int = Query(default=100, lte=100),
+    after: Optional[str] = None,
+    count: bool = False
+):
+    try:
+        params = page_params(after=after, offset=offset, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid cursor!')
+    teams = (await session.execute(TEAM_ROWS_PAGE, params)).all()
+    cursor = next_cursor(teams, limit)
+    if cursor:
+        response.headers[CURSOR_HEADER] = cursor
+    if count:
+        response.headers[TOTAL_COUNT_HEADER] = str(await session.run_sync(read_row_count, Team))
+    return teams
+
+
+@app.post("/teams/", response_model=TeamRead)
+async def create_team(*, session: AsyncSession = Depends(get_session), team: TeamCreate):
+    team_data = team.dict()
+    result = await session.execute(insert(Team.__table__), team_data)
+    await session.commit()
+    return TeamRead(id=result.inserted_primary_key[0], **team_data)
+
+
+@app.get("/teams/{team_id}", response_model=TeamReadWithHeroes)
+async def read_team(*, session: AsyncSession = Depends(get_session), team_id: int):
+    team = (await session.execute(TEAM_BY_ID, {'team_id': team_id})).scalars().first()
+    if not team:
+        raise HTTPException(status_code=404, detail='Team not found!')
+    return team
+
+
+@app.patch("/teams/{team_id}", response_model=TeamRead)
+async def update_team(
+    *,
+    session: AsyncSession = Depends(get_session),
+    team_id: int,
+    team: TeamUpdate
+):
+    db_team = await session.get(Team, team_id)
+    if not db_team:
+        raise HTTPException(status_code=404, detail='Team not found!')
+    team_data = team.dict(exclude_unset=True)
+    for key, value in team_data.items():
+        setattr(db_team, key, value)
+    db_team.version = Team.version + 1
+    session.add(db_team)
+    await session.commit()
+    await session.refresh(db_team)
+    return db_team
+
+
+@app.delete("/teams/{team_id}")
+async def delete_team(*, session: AsyncSession = Depends(get_session), team_id: int):
+    # One UPDATE for the team's heroes instead of loading them, like app.py.
+    await session.execute(
+        update(Hero.__table__).where(Hero.team_id == team_id).values(team_id=None, version=Hero.version + 1)
+    )
+    if not (await session.execute(delete(Team.__table__).where(Team.id == team_id))).rowcount:
+        await session.rollback()
+        raise HTTPException(status_code=404, detail='Team not found!')
+    await session.execute(delete(TeamStats.__table__).where(TeamStats.team_id == team_id))
+    await session.commit()
+    return {'ok': True}
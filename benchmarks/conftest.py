@@ -0,0 +1,24 @@
+import pytest
+from sqlmodel import Session
+
+from models import AppModel, Hero, Team
+from project.bulk import bulk_insert
+from project.database import create_db_engine
+
+
+@pytest.fixture(name='hero_engine')
+def hero_engine_fixture(tmp_path):
+    # hero_engine(rows) is an engine on a new app database in tmp_path holding `rows` heroes
+    # (all on one team with team=True). Keyword arguments go to create_db_engine().
+    def create(rows: int = 0, *, team: bool = False, **kwargs):
+        engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}", **kwargs)
+        AppModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            team_id = bulk_insert(session, Team, [{'name': 'Preventers', 'headquarters': 'Sharp Tower'}])[0] if team else None
+            bulk_insert(session, Hero, [
+                {'name': f'Hero {i}', 'secret_name': 'Secret', 'age': i % 90, 'team_id': team_id} for i in range(rows)
+            ])
+            session.commit()
+        return engine
+
+    return create
@@ -0,0 +1,180 @@
+"""Endpoint benchmarks for app.py and project/main.py at several data sizes.
+
+    python -m benchmarks.endpoints --scales 1000 100000 1000000 --output results.json
+    python -m benchmarks.endpoints --scales 1000 100000 --baseline results.json
+
+Every CRUD endpoint is driven in-process through the ASGI app against a seeded SQLite
+file. Results are written as JSON, and --baseline fails the run (exit code 1) when an
+endpoint got slower than the stored results by more than --tolerance.
+"""
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel
+
+import app as app_module
+import project.main as project_module
+from models import AppModel, Hero, Team
+from project.bulk import bulk_insert
+from project.database import create_db_engine
+
+from .timing import measure
+
+
+SCALES = (1_000, 100_000, 1_000_000)
+DEFAULT_CALLS = 200
+HEROES_PER_TEAM = 100
+
+
+def seed(session: Session, hero_model, rows: int, team_model=None, batch_size: int = 10_000):
+    team_ids = []
+    if team_model is not None:
+        teams = [{'name': f'Team {i}', 'headquarters': f'Tower {i % 10}'} for i in range(max(1, rows // HEROES_PER_TEAM))]
+        team_ids = bulk_insert(session, team_model, teams, batch_size=batch_size)
+
+    def heroes():
+        for i in range(rows):
+            hero = {'name': f'Hero {i}', 'secret_name': f'Secret {i}', 'age': i % 90}
+            if team_ids:
+                hero['team_id'] = team_ids[i % len(team_ids)]
+            yield hero
+
+    bulk_insert(session, hero_model, heroes(), batch_size=batch_size)
+    session.commit()
+
+
+def client_for(fastapi_app, get_session, engine) -> TestClient:
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    fastapi_app.dependency_overrides[get_session] = get_session_override
+    return TestClient(fastapi_app)
+
+
+def checked(response, status_code: int = 200):
+    if response.status_code != status_code:
+        raise AssertionError(f'{response.request.method} {response.request.url}: {response.status_code} {response.text}')
+    return response
+
+
+def scenarios(client: TestClient, rows: int, rng: random.Random, with_teams: bool) -> Dict[str, Tuple[Callable[[int], object], int]]:
+    # endpoint -> (call, how many calls the seeded data allows)
+    hero = {'name': 'Benchmark', 'secret_name': 'Bench'}
+    cursor = checked(client.get('/heroes/', params={'offset': rows // 2, 'limit': 100})).headers.get('X-Next-Cursor')
+    unlimited = sys.maxsize
+    calls = {
+        'POST /heroes/': (lambda i: checked(client.post('/heroes/', json=hero)), unlimited),
+        'GET /heroes/ offset': (lambda i: checked(client.get('/heroes/', params={'offset': rng.randrange(rows), 'limit': 100})), unlimited),
+        'GET /heroes/ cursor': (lambda i: checked(client.get('/heroes/', params={'after': cursor, 'limit': 100})), unlimited),
+        'GET /heroes/{id}': (lambda i: checked(client.get(f'/heroes/{rng.randrange(1, rows)}')), unlimited),
+        'PATCH /heroes/{id}': (lambda i: checked(client.patch(f'/heroes/{rng.randrange(1, rows)}', json={'age': i % 90})), unlimited),
+        # Walks down from the last seeded id, so every call deletes an existing hero.
+        'DELETE /heroes/{id}': (lambda i: checked(client.delete(f'/heroes/{rows - i}')), rows - 1),
+    }
+    if with_teams:
+        teams = max(1, rows // HEROES_PER_TEAM)
+        calls.update({
+            'POST /teams/': (lambda i: checked(client.post('/teams/', json={'name': 'Benchmark', 'headquarters': 'Bench'})), unlimited),
+            'GET /teams/': (lambda i: checked(client.get('/teams/', params={'offset': rng.randrange(teams), 'limit': 100})), unlimited),
+            'GET /teams/{id}': (lambda i: checked(client.get(f'/teams/{rng.randrange(1, teams + 1)}')), unlimited),
+            'PATCH /teams/{id}': (
+                lambda i: checked(client.patch(f'/teams/{rng.randrange(1, teams + 1)}', json={'headquarters': f'Tower {i}'})), unlimited
+            ),
+            'DELETE /teams/{id}': (lambda i: checked(client.delete(f'/teams/{teams - i}')), teams),
+        })
+    return calls
+
+
+def run_app(name: str, fastapi_app, get_session, metadata, hero_model, team_model, rows: int, calls: int, workdir: Path) -> List[dict]:
+    engine = create_db_engine(f"sqlite:///{workdir / f'{name}-{rows}.db'}")
+    metadata.create_all(engine)
+    start = time.perf_counter()
+    with Session(engine) as session:
+        seed(session, hero_model, rows, team_model)
+    print(f'{name}: seeded {rows} heroes in {time.perf_counter() - start:.1f}s')
+
+    # Cached hero/team bodies from a previous database would be served as hits.
+    app_module.entity_cache.clear()
+    client = client_for(fastapi_app, get_session, engine)
+    rng = random.Random(rows)
+    results = []
+    try:
+        for endpoint, (fn, limit) in scenarios(client, rows, rng, with_teams=team_model is not None).items():
+            timing = measure(f'{name} {endpoint} @{rows}', fn, min(calls, limit))
+            results.append({'app': name, 'endpoint': endpoint, 'rows': rows, **timing.as_dict()})
+    finally:
+        fastapi_app.dependency_overrides.clear()
+        engine.dispose()
+    return results
+
+
+def run(scales=SCALES, calls: int = DEFAULT_CALLS, workdir: Optional[Path] = None) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = workdir or Path(tmp)
+        results = []
+        for rows in scales:
+            results += run_app('app', app_module.app, app_module.get_session, AppModel.metadata, Hero, Team, rows, calls, workdir)
+            results += run_app(
+                'project', project_module.app, project_module.get_session, SQLModel.metadata, project_module.Hero, None, rows, calls, workdir
+            )
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'calls': calls,
+        },
+        'results': results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2) -> List[str]:
+    # A regression is a p95 more than `tolerance` above the baseline, or throughput more
+    # than `tolerance` below it. Endpoints missing from the baseline are not compared.
+    previous = {(r['app'], r['endpoint'], r['rows']): r for r in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        base = previous.get((result['app'], result['endpoint'], result['rows']))
+        if base is None:
+            continue
+        label = f"{result['app']} {result['endpoint']} @{result['rows']}"
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {base['p95_ms']:.3f}ms -> {result['p95_ms']:.3f}ms")
+        if result['ops_per_sec'] < base['ops_per_sec'] * (1 - tolerance):
+            regressions.append(f"{label}: {base['ops_per_sec']:,.0f} -> {result['ops_per_sec']:,.0f} ops/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the CRUD endpoints at several data sizes.')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(SCALES))
+    parser.add_argument('--calls', type=int, default=DEFAULT_CALLS, help='calls per endpoint and scale')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = run(args.scales, args.calls)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy.pool import QueuePool
+from sqlmodel import Session
+
+from app import insert_hero
+from models import HeroCreate
+from project.coalescer import WriteCoalescer
+
+from .timing import scaled
+
+
+def throughput(threads: int, calls: int, write) -> float:
+    def worker(offset):
+        for i in range(calls):
+            write(offset + i)
+
+    workers = [threading.Thread(target=worker, args=(n * calls,)) for n in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return threads * calls / (time.perf_counter() - start)
+
+
+@pytest.mark.parametrize('threads', [1, 8, 32])
+def test_write_throughput(hero_engine, threads):
+    # The default profile (rollback journal, synchronous=FULL) makes every commit an fsync.
+    engine = hero_engine(profile='default', poolclass=QueuePool, pool_size=threads, max_overflow=0)
+    calls = scaled(20)
+
+    def direct(i):
+        with Session(engine) as session:
+            insert_hero(session, HeroCreate(name=f'Hero {i}', secret_name='Secret'))
+            session.commit()
+
+    coalescer = WriteCoalescer(engine)
+    coalescer.start()
+    before = throughput(threads, calls, direct)
+    after = throughput(threads, calls, lambda i: coalescer.run(lambda session: insert_hero(session, HeroCreate(name=f'Hero {i}', secret_name='Secret'))))
+    coalescer.stop()
+    batches = coalescer.batch_sizes
+    print(
+        f'{threads} threads: direct {before:,.0f} writes/s, coalesced {after:,.0f} writes/s '
+        f'({batches.sum / batches.count:.1f} per commit)'
+    )
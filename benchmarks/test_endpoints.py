@@ -0,0 +1,20 @@
+from .endpoints import compare, run
+from .timing import scaled
+
+
+def test_endpoint_benchmarks():
+    results = run(scales=[scaled(1_000)], calls=scaled(20))
+
+    endpoints = {(r['app'], r['endpoint']) for r in results['results']}
+    assert ('app', 'GET /teams/{id}') in endpoints
+    assert ('project', 'DELETE /heroes/{id}') in endpoints
+    assert all(r['ops_per_sec'] > 0 for r in results['results'])
+    assert compare(results, results) == []
+
+
+def test_compare_flags_regressions():
+    baseline = {'results': [{'app': 'app', 'endpoint': 'GET /heroes/{id}', 'rows': 1000, 'p95_ms': 1.0, 'ops_per_sec': 1000}]}
+    slower = {'results': [{'app': 'app', 'endpoint': 'GET /heroes/{id}', 'rows': 1000, 'p95_ms': 1.5, 'ops_per_sec': 700}]}
+
+    assert len(compare(slower, baseline, tolerance=0.2)) == 2
+    assert compare(slower, baseline, tolerance=0.6) == []
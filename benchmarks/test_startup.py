@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Boots app.py in a fresh interpreter (so nothing is configured or compiled yet), sends one
+# request and prints GET /startup/stats.
+BOOT = '''
+import json
+from fastapi.testclient import TestClient
+from app import app
+with TestClient(app) as client:
+    client.get('/heroes/1')
+    print(json.dumps(client.get('/startup/stats').json()))
+'''
+
+
+def boot(workdir: Path, warm_up: bool) -> dict:
+    env = {**os.environ, 'PYTHONPATH': str(ROOT), 'WARM_UP': '1' if warm_up else '0'}
+    output = subprocess.run([sys.executable, '-c', BOOT], cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize('warm_up', [False, True])
+def test_time_to_first_request(tmp_path, warm_up):
+    boot(tmp_path, warm_up)  # creates the schema
+    stats = boot(tmp_path, warm_up)
+    assert stats['schema_created'] is False
+    first_request_ms = stats['first_request_ms'] - stats['ready_ms']
+    print(
+        f"warm-up {'on' if warm_up else 'off'}: ready {stats['ready_ms']:.1f}ms after import "
+        f"(schema {stats['schema_ms']:.1f}ms), first request {first_request_ms:.1f}ms later"
+    )
@@ -0,0 +1,36 @@
+from sqlalchemy import select as sa_select
+from sqlmodel import Session, select
+
+from models import Hero, HeroReadWithTeam
+from project.instrumentation import track_statement_cache
+from project.loading import eager_options
+from queries import HERO_BY_ID
+
+from .timing import measure, scaled
+
+
+def test_prebuilt_statement_overhead(hero_engine):
+    engine = hero_engine(100, team=True)
+    cache = track_statement_cache(engine)
+    options = eager_options(Hero, HeroReadWithTeam)
+
+    def built(i):
+        # What read_hero did before: SQLModel's select(), which SQLAlchemy compiles on every call.
+        with Session(engine) as session:
+            return session.exec(select(Hero).where(Hero.id == i % 100 + 1).options(*options)).first()
+
+    def built_cacheable(i):
+        with Session(engine) as session:
+            return session.execute(sa_select(Hero).where(Hero.id == i % 100 + 1).options(*options)).scalars().first()
+
+    def prebuilt(i):
+        with Session(engine) as session:
+            return session.execute(HERO_BY_ID, {'hero_id': i % 100 + 1}).scalars().first()
+
+    calls = scaled(500)
+    before = measure('select() per call', built, calls)
+    assert (cache.hits, cache.uncached) == (0, calls)
+    measure('cacheable select() per call', built_cacheable, calls)
+    after = measure('prebuilt statement', prebuilt, calls)
+    assert cache.misses == 2
+    print(f'per call p50: {before.p50_ms:.3f}ms -> {after.p50_ms:.3f}ms ({before.p50_ms / after.p50_ms:.2f}x)')
@@ -0,0 +1,57 @@
+import os
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+
+# Benchmarks run with small sizes inside the normal test run; BENCH_SCALE multiplies them.
+SCALE = float(os.environ.get('BENCH_SCALE', 1))
+
+
+def scaled(n: int) -> int:
+    return max(1, int(n * SCALE))
+
+
+@dataclass
+class Timing:
+    name: str
+    calls: int
+    ops_per_sec: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def __str__(self):
+        return (
+            f'{self.name}: {self.calls} calls, {self.ops_per_sec:,.0f} ops/s, '
+            f'p50 {self.p50_ms:.3f}ms p95 {self.p95_ms:.3f}ms p99 {self.p99_ms:.3f}ms'
+        )
+
+
+def measure(name: str, fn: Callable[[int], object], calls: int) -> Timing:
+    # fn gets the call number, so every call can work on its own row.
+    samples = []
+    for i in range(calls):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    total = sum(samples)
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+    timing = Timing(
+        name=name,
+        calls=calls,
+        ops_per_sec=calls / total if total else float('inf'),
+        p50_ms=statistics.median(samples) * 1000,
+        p95_ms=percentile(0.95),
+        p99_ms=percentile(0.99),
+    )
+    print(timing)
+    return timing
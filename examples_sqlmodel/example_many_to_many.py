@@ -3,16 +3,17 @@ from sqlalchemy import engine
 from sqlalchemy.sql.expression import table
 from sqlalchemy.sql.schema import ForeignKey
 
-from sqlmodel import SQLModel, create_engine, Field, Session, Relationship, select
+from sqlmodel import SQLModel, create_engine, Field, Session, Relationship, delete, insert, select
 
 engine = create_engine('sqlite:///many_to_many.db', echo=False)
 
 
 class HeroTeamAssociation(SQLModel, table=True):
+    # The (team_id, hero_id) primary key already serves lookups by team_id, hero_id needs its own index.
     team_id: Optional[int] = Field(
-        default=None, primary_key=True, foreign_key='team.id')
+        default=None, primary_key=True, foreign_key='team.id', index=False)
     hero_id: Optional[int] = Field(
-        default=None, primary_key=True, foreign_key='hero.id')
+        default=None, primary_key=True, foreign_key='hero.id', index=True)
 
     # is_training: bool = False
 
@@ -22,9 +23,9 @@ class HeroTeamAssociation(SQLModel, table=True):
 
 
 class Team(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
-    headquarters: str
+    id: Optional[int] = Field(default=None, primary_key=True, index=False)
+    name: str = Field(index=True)
+    headquarters: str = Field(index=False)
     heroes: List['Hero'] = Relationship(
         back_populates='teams', link_model=HeroTeamAssociation)
 
@@ -32,10 +33,10 @@ class Team(SQLModel, table=True):
 
 
 class Hero(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
-    secret_name: str
-    age: Optional[int] = None
+    id: Optional[int] = Field(default=None, primary_key=True, index=False)
+    name: str = Field(index=True)
+    secret_name: str = Field(index=False)
+    age: Optional[int] = Field(default=None, index=False)
     # team_id is not needed for M-to-M because now the relationship is done via the link table., the team_id attr is only needed for 1-to-M and/or 1-to-1
     # team_id: Optional[int] = Field(default=None, ForeignKey='team.id')
     # In M-to-M teams attr is no longer an Optional field but a List[Team]
@@ -94,10 +95,12 @@ def update_heroes():
         team_z_force = session.exec(
             select(Team).where(Team.name == 'Z-Force')
         ).one()
-        team_z_force.heroes.append(hero_spider_boy)
-        session.add(team_z_force)
+        # team_z_force.heroes.append(hero_spider_boy) would load every hero of the team first.
+        # INSERT OR IGNORE skips the link if it already exists, rowcount says whether it was added.
+        added = session.execute(insert(HeroTeamAssociation).prefix_with('OR IGNORE').values(
+            team_id=team_z_force.id, hero_id=hero_spider_boy.id)).rowcount
         session.commit()
-        # session.refresh(team_z_force)
+        print('Links added:', added)
         print("Updated Spider-Boy's Teams:", hero_spider_boy.teams)
         print("Z-Force heroes:", team_z_force.heroes)
 
@@ -110,23 +113,37 @@ def remove_team_association():
         team_z_force = session.exec(
             select(Team).where(Team.name == 'Z-Force')
         ).one()
-        try:
-
-            hero_spider_boy.teams.remove(team_z_force)
-            session.add(team_z_force)
-            session.commit()
-        except ValueError as ve:
+        # hero_spider_boy.teams.remove(team_z_force) would load every team of the hero first.
+        removed = session.execute(delete(HeroTeamAssociation).where(
+            HeroTeamAssociation.team_id == team_z_force.id,
+            HeroTeamAssociation.hero_id == hero_spider_boy.id)).rowcount
+        session.commit()
+        if not removed:
             print(
                 f'Error: {hero_spider_boy.name} is already not in {team_z_force.name}')
         print("Reverted Z-Force's heroes:", team_z_force.heroes)
         print("Reverted Spider-Boy's teams:", hero_spider_boy.teams)
 
 
+def delete_team():
+    with Session(engine) as session:
+        team_z_force = session.exec(
+            select(Team).where(Team.name == 'Z-Force')
+        ).one()
+        # session.delete(team_z_force) would load every hero of the team to delete the links one by one.
+        removed = session.execute(delete(HeroTeamAssociation).where(
+            HeroTeamAssociation.team_id == team_z_force.id)).rowcount
+        session.execute(delete(Team).where(Team.id == team_z_force.id))
+        session.commit()
+        print('Links removed with Z-Force:', removed)
+
+
 def main():
     create_db_and_tables()
     create_heroes()
     # update_heroes()
     # remove_team_association()
+    # delete_team()
 
 
 if __name__ == '__main__':
@@ -9,12 +9,13 @@ engine = create_engine('sqlite:///two_one_to_many.db', echo=False)
 
 
 class HeroTeamAssociation(SQLModel, table=True):
+    # The (team_id, hero_id) primary key already serves lookups by team_id, hero_id needs its own index.
     team_id: Optional[int] = Field(
-        default=None, primary_key=True, foreign_key='team.id')
+        default=None, primary_key=True, foreign_key='team.id', index=False)
     hero_id: Optional[int] = Field(
-        default=None, primary_key=True, foreign_key='hero.id')
+        default=None, primary_key=True, foreign_key='hero.id', index=True)
 
-    is_training: bool = False
+    is_training: bool = Field(default=False, index=False)
 
     # In SQLAlchemy this is called an Association Object or Association Model. In SQLModel docs, it's referred as Link Model.
     team: "Team" = Relationship(back_populates="hero_links")
@@ -22,9 +23,9 @@ class HeroTeamAssociation(SQLModel, table=True):
 
 
 class Team(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
-    headquarters: str
+    id: Optional[int] = Field(default=None, primary_key=True, index=False)
+    name: str = Field(index=True)
+    headquarters: str = Field(index=False)
     # in two One-to-Many Relationship, we don't need list of heroes. We no longer have the heroes relationship attribute, and instead we have the new hero_links attribute:
     # heroes: List['Hero'] = Relationship(
     #     back_populates='teams', link_model=HeroTeamAssociation)
@@ -33,10 +34,10 @@ class Team(SQLModel, table=True):
 
 
 class Hero(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
-    secret_name: str
-    age: Optional[int] = None
+    id: Optional[int] = Field(default=None, primary_key=True, index=False)
+    name: str = Field(index=True)
+    secret_name: str = Field(index=False)
+    age: Optional[int] = Field(default=None, index=False)
     # in two One-to-Many Relationship, we don't need list of teams
     # teams: List[Team] = Relationship(
     #     back_populates='heroes', link_model=HeroTeamAssociation)
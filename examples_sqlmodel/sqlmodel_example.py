@@ -1,24 +1,28 @@
 from operator import or_
 from typing import List, Optional
 
+from sqlalchemy import Index
 from sqlmodel import create_engine, Field, Relationship, Session, SQLModel, col, or_, select
 
 
 class Team(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
-    headquarters: str
+    id: Optional[int] = Field(default=None, primary_key=True, index=False)
+    name: str = Field(index=True)
+    headquarters: str = Field(index=True)
 
     heroes: List['Hero'] = Relationship(back_populates='team')
 
 
 class Hero(SQLModel, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
-    secret_name: str
-    age: Optional[int] = None
+    # Without index=... SQLModel indexes every column; these are the ones the select_* functions filter on.
+    __table_args__ = (Index('ix_hero_team_id_age', 'team_id', 'age'),)
 
-    team_id: Optional[int] = Field(default=None, foreign_key='team.id')
+    id: Optional[int] = Field(default=None, primary_key=True, index=False)
+    name: str = Field(index=True)
+    secret_name: str = Field(index=False)
+    age: Optional[int] = Field(default=None, index=True)
+
+    team_id: Optional[int] = Field(default=None, foreign_key='team.id', index=False)
     team: Optional[Team] = Relationship(back_populates='heroes')
 
 
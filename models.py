@@ -1,15 +1,32 @@
 from typing import List, Optional
 
+from sqlalchemy import DDL, Index, event
+from sqlalchemy.orm import registry
 from sqlmodel import Field, Relationship, SQLModel
 
 
-class TeamBase(SQLModel):
-    name: str
-    headquarters: str
+# The app's tables get their own registry (and MetaData) so they can live in the same
+# process as the standalone tutorial in project/, which also defines a `hero` table.
+class AppModel(SQLModel, registry=registry()):
+    pass
+
+
+# SQLModel indexes every column unless told otherwise, so each column says whether it is
+# looked up: only the columns the queries filter on are indexed, the rest would just slow
+# down writes.
+class TeamBase(AppModel):
+    name: str = Field(index=True)
+    headquarters: str = Field(index=True)
 
 
 class Team(TeamBase, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+    # AUTOINCREMENT: a deleted team's id (and with it its ETag, the version starts at 1 again)
+    # is never handed to a new team.
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id: Optional[int] = Field(default=None, primary_key=True, index=False)
+    # Bumped by every change to the team or to its heroes (they are part of its body), the ETag of GET /teams/{id}.
+    version: int = Field(default=1, index=False, sa_column_kwargs={'server_default': '1'})
 
     heroes: List['Hero'] = Relationship(back_populates='team')
 
@@ -28,17 +45,23 @@ class TeamUpdate(TeamBase):
     headquarters: Optional[str] = None
 
 
-class HeroBase(SQLModel):
-    name: str
-    secret_name: str
-    age: Optional[int] = None
+class HeroBase(AppModel):
+    name: str = Field(index=True)
+    secret_name: str = Field(index=False)
+    age: Optional[int] = Field(default=None, index=True)
     team_id: Optional[int] = None
 
 
 class Hero(HeroBase, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+    # (team_id, age) serves Team.heroes loads and team_id lookups through its leading
+    # column, as well as "heroes of a team in an age range". Ids aren't reused, like Team's.
+    __table_args__ = (Index('ix_hero_team_id_age', 'team_id', 'age'), {'sqlite_autoincrement': True})
+
+    id: Optional[int] = Field(default=None, primary_key=True, index=False)
+    # Bumped by every change to the hero, GET /heroes/{id} combines it with the team's version.
+    version: int = Field(default=1, index=False, sa_column_kwargs={'server_default': '1'})
 
-    team_id: Optional[int] = Field(default=None, foreign_key='team.id')
+    team_id: Optional[int] = Field(default=None, foreign_key='team.id', index=False)
     team: Optional[Team] = Relationship(back_populates="heroes")
 
 
@@ -56,9 +79,70 @@ class HeroUpdate(HeroBase):
     age: Optional[int] = None
 
 
+class HeroBatchUpdate(HeroUpdate):
+    id: int
+
+
+class HeroBatchResult(AppModel):
+    id: int
+    ok: bool
+    detail: Optional[str] = None
+
+
 class HeroReadWithTeam(HeroRead):
     team: Optional[TeamRead] = None
 
 
 class TeamReadWithHeroes(TeamRead):
     heroes: List[HeroRead] = []
+
+
+class TeamStats(AppModel, table=True):
+    # One row per team that has (or had) heroes, kept up to date by stats.record_hero_change()
+    # on every hero write. The average is age_sum / age_count: heroes without an age don't count.
+    team_id: Optional[int] = Field(default=None, primary_key=True, foreign_key='team.id', index=False)
+    hero_count: int = Field(default=0, index=False)
+    age_count: int = Field(default=0, index=False)
+    age_sum: int = Field(default=0, index=False)
+    min_age: Optional[int] = Field(default=None, index=False)
+    max_age: Optional[int] = Field(default=None, index=False)
+
+
+class TeamStatsRead(AppModel):
+    team_id: int
+    hero_count: int = 0
+    average_age: Optional[float] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+
+
+class RowCount(AppModel, table=True):
+    # The number of rows of hero and team, for X-Total-Count: COUNT(*) reads a whole table (or
+    # index) on SQLite. Triggers move the counts in the transaction of every insert and delete,
+    # whichever code path writes the rows, without sending another statement.
+    table_name: Optional[str] = Field(default=None, primary_key=True, index=False)
+    row_count: int = Field(default=0, index=False)
+
+
+COUNTED_MODELS = (Hero, Team)
+
+
+def row_count_triggers(table_name: str) -> List[DDL]:
+    return [
+        DDL(
+            f'CREATE TRIGGER IF NOT EXISTS {table_name}_row_count_{event_name} AFTER {event_name.upper()} ON {table_name} '
+            f"BEGIN INSERT INTO rowcount (table_name, row_count) VALUES ('{table_name}', {delta}) "
+            f'ON CONFLICT (table_name) DO UPDATE SET row_count = row_count + {delta}; END'
+        )
+        for event_name, delta in (('insert', 1), ('delete', -1))
+    ]
+
+
+@event.listens_for(AppModel.metadata, 'after_create')
+def create_row_count_triggers(metadata, connection, tables=(), **kwargs):
+    # Added with the rowcount table, which stats.create_maintained_tables() fills in when the
+    # counted tables already have rows.
+    if RowCount.__table__ in tables:
+        for model in COUNTED_MODELS:
+            for trigger in row_count_triggers(model.__tablename__):
+                connection.execute(trigger)
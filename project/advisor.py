@@ -0,0 +1,59 @@
+from typing import Dict, List
+
+from sqlalchemy import MetaData, inspect
+
+
+def explain_query_plan(conn, statement) -> List[str]:
+    # The statement is compiled with its parameters inlined: EXPLAIN only needs a representative query.
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+
+
+def find_scans(engine, queries: Dict[str, object]) -> Dict[str, List[str]]:
+    # Every plan step that reads a whole table (or a whole index) instead of searching it,
+    # e.g. "SCAN hero" on SQLite 3.36+ or "SCAN TABLE hero" before.
+    scans = {}
+    with engine.connect() as conn:
+        for name, statement in queries.items():
+            steps = [step for step in explain_query_plan(conn, statement) if step.startswith('SCAN')]
+            if steps:
+                scans[name] = steps
+    return scans
+
+
+def ensure_indexes(engine, metadata: MetaData):
+    # create_all() only creates the indexes of tables it creates, this adds the declared
+    # indexes that an existing database is missing.
+    existing_tables = set(inspect(engine).get_table_names())
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def undeclared_indexes(engine, metadata: MetaData) -> Dict[str, List[str]]:
+    # Indexes in the database that the models no longer declare, e.g. the ones older SQLModel
+    # versions created for every column. They only cost writes; dropping them is left to the operator.
+    inspector = inspect(engine)
+    undeclared = {}
+    for table in metadata.sorted_tables:
+        if table.name not in inspector.get_table_names():
+            continue
+        declared = {index.name for index in table.indexes}
+        extra = [index['name'] for index in inspector.get_indexes(table.name) if index['name'] not in declared]
+        if extra:
+            undeclared[table.name] = extra
+    return undeclared
+
+
+def report(engine, metadata: MetaData, queries: Dict[str, object]) -> int:
+    scans = find_scans(engine, queries)
+    for name, steps in scans.items():
+        for step in steps:
+            print(f'{name}: {step}')
+    for table, names in undeclared_indexes(engine, metadata).items():
+        print(f'{table}: undeclared indexes {", ".join(names)}')
+    if not scans:
+        print(f'{len(queries)} queries, no table scans')
+    return len(scans)
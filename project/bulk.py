@@ -0,0 +1,95 @@
+from collections import defaultdict
+from typing import Iterable, Iterator, List
+
+from sqlalchemy import bindparam, delete, insert, text, tuple_, update
+from sqlmodel import Session
+
+
+DEFAULT_BATCH_SIZE = 1000
+# SQLite before 3.32 allows 999 bound parameters per statement, which caps the size of an IN list.
+MAX_PARAMETERS = 999
+# Every pair in a DELETE ... IN is two bound parameters.
+DELETE_BATCH_SIZE = MAX_PARAMETERS // 2
+
+
+def batched(rows: Iterable, batch_size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_row(session: Session, model, row: dict) -> int:
+    # A single INSERT: the new primary key comes from the cursor's lastrowid, so there is
+    # no need for the SELECT that session.refresh() would issue after the commit.
+    result = session.execute(insert(model.__table__), row)
+    return result.inserted_primary_key[0]
+
+
+def bulk_insert(session: Session, model, rows: Iterable[dict], *, batch_size: int = DEFAULT_BATCH_SIZE) -> List[int]:
+    # Every batch is a single executemany() and nothing is committed here, so the caller
+    # decides when the whole load becomes visible (or rolls all of it back).
+    ids = []
+    for batch in batched(rows, batch_size):
+        session.execute(insert(model.__table__), batch)
+        # The transaction holds SQLite's write lock after the first insert, so the rowids
+        # of a batch are consecutive and end at last_insert_rowid().
+        last_id = session.execute(text('SELECT last_insert_rowid()')).scalar()
+        ids.extend(range(last_id - len(batch) + 1, last_id + 1))
+    return ids
+
+
+def insert_links(session: Session, link_model, rows: Iterable[dict], *, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    # Adds rows to a link table (e.g. {'team_id': 1, 'hero_id': 2}) without loading the
+    # relationship collections on either side. Existing links are skipped by INSERT OR IGNORE,
+    # so the result is the number of links that were actually added.
+    statement = insert(link_model.__table__).prefix_with('OR IGNORE')
+    added = 0
+    for batch in batched(rows, batch_size):
+        added += session.execute(statement, batch).rowcount
+    return added
+
+
+def delete_links(session: Session, link_model, rows: Iterable[dict], *, batch_size: int = DELETE_BATCH_SIZE) -> int:
+    # One DELETE ... WHERE (team_id, hero_id) IN (...) per batch, matched on the link table's
+    # primary key. Collections already loaded in the session are not updated, expire them if needed.
+    table = link_model.__table__
+    key = table.primary_key.columns.values()
+    removed = 0
+    for batch in batched(rows, batch_size):
+        pairs = [tuple(row[column.name] for column in key) for row in batch]
+        removed += session.execute(delete(table).where(tuple_(*key).in_(pairs))).rowcount
+    return removed
+
+
+def delete_links_by(session: Session, link_model, **key) -> int:
+    # All the links of one side, e.g. team_id=1 before deleting that team: one DELETE, where
+    # session.delete(team) loads the team's collection and deletes its links row by row.
+    table = link_model.__table__
+    return session.execute(delete(table).where(*(table.c[name] == value for name, value in key.items()))).rowcount
+
+
+def bulk_update(session: Session, model, rows: Iterable[dict], *, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    # Rows are {primary key: ..., column: new value, ...}. The rows that set the same columns
+    # share one UPDATE ... WHERE id = ?, sent with executemany() per batch, so a list of
+    # partial updates costs one statement per distinct set of columns rather than per row.
+    table = model.__table__
+    (key,) = table.primary_key.columns
+    groups = defaultdict(list)
+    for row in rows:
+        columns = tuple(sorted(name for name in row if name != key.name))
+        if columns:
+            # update() reserves the column names for its own parameters, hence the prefix.
+            groups[columns].append({f'b_{name}': value for name, value in row.items()})
+    updated = 0
+    for columns, group in groups.items():
+        statement = update(table).where(key == bindparam(f'b_{key.name}')).values(
+            {name: bindparam(f'b_{name}') for name in columns}
+        )
+        for batch in batched(group, batch_size):
+            updated += session.execute(statement, batch).rowcount
+    return updated
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class EntityCache:
+    """In-process LRU cache with a TTL for serialized API responses.
+
+    Entries can depend on other keys (a hero embeds its team, a team embeds its heroes),
+    and invalidating a key also drops everything that depends on it.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 30.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any, Tuple[Hashable, ...]]]' = OrderedDict()
+        self._dependents: Dict[Hashable, set] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        # Read it before loading from the database and pass it to set(): if anything was
+        # invalidated in between, the (possibly stale) value is not stored.
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, _ = entry
+            if expires_at <= self.clock():
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, *, depends_on: Iterable[Hashable] = (), generation: Optional[int] = None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            depends_on = tuple(depends_on)
+            self._entries[key] = (self.clock() + self.ttl, value, depends_on)
+            for parent in depends_on:
+                self._dependents.setdefault(parent, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, *keys: Hashable):
+        with self._lock:
+            self._generation += 1
+            pending = list(keys)
+            while pending:
+                key = pending.pop()
+                pending.extend(self._dependents.pop(key, ()))
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._dependents.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _remove(self, key: Hashable):
+        _, _, depends_on = self._entries.pop(key)
+        for parent in depends_on:
+            dependents = self._dependents.get(parent)
+            if dependents is not None:
+                dependents.discard(key)
+                if not dependents:
+                    del self._dependents[parent]
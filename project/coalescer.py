@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+from sqlmodel import Session
+
+from .instrumentation import LATENCY_BUCKETS, Histogram
+
+T = TypeVar('T')
+
+BATCH_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500)
+
+_STOP = object()
+
+
+class WriteCoalescer:
+    """Runs the write operations of many request threads on one writer thread.
+
+    Operations waiting in the queue are taken together, up to `max_batch_size` or until
+    `max_wait` seconds after the first one, and committed in a single transaction: one
+    fsync and one acquisition of SQLite's write lock for the whole batch. An operation that
+    raises fails alone, the rest of its batch is run again without it.
+    """
+
+    def __init__(self, engine, *, max_batch_size: int = 100, max_wait: float = 0.002):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.batch_sizes = Histogram(BATCH_BUCKETS)
+        self.commit_latency = Histogram(LATENCY_BUCKETS)
+        self.max_queue_depth = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._drain, name='write-coalescer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # The operations queued before stop() are still committed.
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def submit(self, operation: Callable[[Session], T]) -> 'Future[T]':
+        # `operation` gets the batch's session and must not commit; its return value is the
+        # future's result once the batch is committed.
+        future: 'Future[T]' = Future()
+        self._queue.put((operation, future))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return future
+
+    def run(self, operation: Callable[[Session], T]) -> T:
+        return self.submit(operation).result()
+
+    def _drain(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit([(operation, future) for operation, future in batch if future.set_running_or_notify_cancel()])
+
+    def _commit(self, batch: List[Tuple[Callable[[Session], object], Future]]):
+        while batch:
+            results = []
+            with Session(self.engine) as session:
+                try:
+                    for operation, _ in batch:
+                        results.append(operation(session))
+                except Exception as e:
+                    session.rollback()
+                    batch[len(results)][1].set_exception(e)
+                    del batch[len(results)]
+                    continue
+                start = time.perf_counter()
+                try:
+                    session.commit()
+                except Exception as e:
+                    for _, future in batch:
+                        future.set_exception(e)
+                    return
+            self.commit_latency.observe(time.perf_counter() - start)
+            self.batch_sizes.observe(len(batch))
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            return
+
+    def render(self) -> str:
+        # Prometheus text exposition format, appended to GET /metrics.
+        lines = [
+            '# HELP write_batch_size Operations committed per write transaction.',
+            '# TYPE write_batch_size histogram',
+            *self.batch_sizes.render('write_batch_size', 'queue="writes"'),
+            '# HELP write_commit_seconds Commit latency of a write batch.',
+            '# TYPE write_commit_seconds histogram',
+            *self.commit_latency.render('write_commit_seconds', 'queue="writes"'),
+            '# HELP write_queue_depth Operations waiting for the writer.',
+            '# TYPE write_queue_depth gauge',
+            f'write_queue_depth{{queue="writes"}} {self._queue.qsize()}',
+            '# HELP write_queue_depth_max Largest queue depth seen.',
+            '# TYPE write_queue_depth_max gauge',
+            f'write_queue_depth_max{{queue="writes"}} {self.max_queue_depth}',
+        ]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,46 @@
+import hashlib
+from typing import Iterable, Optional
+
+from fastapi import Response
+from sqlalchemy import update
+from sqlmodel import Session
+
+from .bulk import MAX_PARAMETERS, batched
+
+
+def entity_etag(*versions: Optional[int]) -> str:
+    # The versions of every row the body is made of, e.g. a hero and its team (None when
+    # the hero has no team). The bodies are byte for byte the same for the same versions.
+    return '"' + '.'.join(str(version or 0) for version in versions) + '"'
+
+
+def collection_etag(rows: Iterable) -> str:
+    # A page changes when a row is added, removed or updated: hashing the (id, version) of
+    # its rows covers all three.
+    digest = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        digest.update(f'{row.id}:{row.version},'.encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/"x" matches "x".
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(','))
+    return etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+
+def not_modified(etag: str, headers: Optional[dict] = None) -> Response:
+    return Response(status_code=304, headers={**(headers or {}), 'ETag': etag})
+
+
+def bump_versions(session: Session, model, ids: Iterable[Optional[int]]):
+    # One UPDATE ... SET version = version + 1 per batch of ids, for the rows whose body
+    # changed without being written themselves (a team whose heroes changed).
+    table = model.__table__
+    ids = sorted({row_id for row_id in ids if row_id is not None})
+    for batch in batched(ids, MAX_PARAMETERS):
+        session.execute(update(table).where(table.c.id.in_(batch)).values(version=table.c.version + 1))
@@ -0,0 +1,28 @@
+import json
+from typing import Iterator, List, Optional
+
+from sqlalchemy import Table
+from sqlmodel import Session
+
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+DEFAULT_EXPORT_BATCH_SIZE = 1000
+
+
+def export_columns(table: Table, fields: Optional[str], allowed: List[str]) -> list:
+    # `fields` is a comma separated projection, e.g. "id,name". Without it every allowed column is exported.
+    names = [name.strip() for name in fields.split(',') if name.strip()] if fields else list(allowed)
+    unknown = [name for name in names if name not in allowed]
+    if unknown or not names:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    return [table.c[name] for name in names]
+
+
+def iter_ndjson(session: Session, statement, *, batch_size: int = DEFAULT_EXPORT_BATCH_SIZE) -> Iterator[str]:
+    # stream_results asks the driver for a server side cursor where it has one, and the
+    # rows are pulled `batch_size` at a time, so memory stays flat however big the table is.
+    # Plain column rows skip the ORM identity map entirely.
+    result = session.execute(statement.execution_options(stream_results=True))
+    keys = list(result.keys())
+    for partition in result.partitions(batch_size):
+        yield ''.join(json.dumps(dict(zip(keys, row))) + '\n' for row in partition)
@@ -0,0 +1,214 @@
+import sqlite3
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+
+class QueryStats:
+    __slots__ = ('statements', 'db_time', 'rows')
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+
+
+# The stats of the request being handled. Starlette copies the context into the threadpool
+# that runs sync handlers, so the same object is updated from there.
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar('query_stats', default=None)
+
+
+@contextmanager
+def collect_query_stats() -> Iterator[QueryStats]:
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def instrument_engine(engine):
+    # Times every statement sent on `engine` and adds it to the current request's stats.
+    # Statements outside of collect_query_stats() are not recorded.
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_time += elapsed
+
+
+class StatementCacheStats:
+    """Hits and misses of an engine's compiled statement cache."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.hits = 0
+        self.misses = 0
+        # Statements SQLAlchemy can't cache (no cache key, e.g. text() with bound values
+        # inlined, or plain driver SQL).
+        self.uncached = 0
+
+    def stats(self) -> dict:
+        cache = self.engine._compiled_cache
+        return {
+            'size': len(cache) if cache is not None else 0,
+            'maxsize': cache.capacity if cache is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'uncached': self.uncached,
+        }
+
+
+def track_statement_cache(engine) -> StatementCacheStats:
+    # Every execution context knows whether its compiled form came from the cache.
+    stats = StatementCacheStats(engine)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def record_cache_hit(conn, cursor, statement, parameters, context, executemany):
+        cache_hit = getattr(context, 'cache_hit', None)
+        if cache_hit is CACHE_HIT:
+            stats.hits += 1
+        elif cache_hit is CACHE_MISS:
+            stats.misses += 1
+        else:
+            stats.uncached += 1
+
+    return stats
+
+
+class CountingCursor(sqlite3.Cursor):
+    # SQLite has no row count for SELECTs, so the rows are counted as they are fetched.
+    def fetchone(self):
+        row = super().fetchone()
+        stats = _current_stats.get()
+        if stats is not None and row is not None:
+            stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.rows += len(rows)
+        return rows
+
+
+class CountingConnection(sqlite3.Connection):
+    # Passed as sqlite3.connect(factory=...) so every cursor SQLAlchemy opens counts its rows.
+    def cursor(self, factory=CountingCursor):
+        return super().cursor(factory)
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> Iterator[str]:
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class RequestMetrics:
+    """Per-route histograms of request latency, DB time and statements per request."""
+
+    histograms = (
+        ('http_request_duration_seconds', 'Request latency.', LATENCY_BUCKETS),
+        ('db_time_seconds', 'Time spent waiting on the database per request.', LATENCY_BUCKETS),
+        ('db_statements_per_request', 'SQL statements issued per request.', STATEMENT_BUCKETS),
+    )
+
+    def __init__(self):
+        self._routes: Dict[str, Tuple[Histogram, ...]] = {}
+        # time.perf_counter() when the first request finished, for the time-to-first-request.
+        self.first_request_at: Optional[float] = None
+
+    def observe(self, route: str, latency: float, stats: QueryStats):
+        if self.first_request_at is None:
+            self.first_request_at = time.perf_counter()
+        histograms = self._routes.get(route)
+        if histograms is None:
+            histograms = self._routes[route] = tuple(Histogram(buckets) for _, _, buckets in self.histograms)
+        for histogram, value in zip(histograms, (latency, stats.db_time, stats.statements)):
+            histogram.observe(value)
+
+    def render(self) -> str:
+        # Prometheus text exposition format.
+        lines = []
+        for index, (name, help_text, _) in enumerate(self.histograms):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for route, histograms in sorted(self._routes.items()):
+                lines.extend(histograms[index].render(name, f'route="{route}"'))
+        return '\n'.join(lines) + '\n'
+
+
+_route_paths: Dict[object, str] = {}
+
+
+def route_name(request) -> str:
+    # The router stores the matched endpoint in the scope; the path template keeps the
+    # label set small (/heroes/{hero_id} rather than one label per id).
+    endpoint = request.scope.get('endpoint')
+    if endpoint is None:
+        return 'unmatched'
+    path = _route_paths.get(endpoint)
+    if path is None:
+        for route in request.app.routes:
+            if getattr(route, 'endpoint', None) is endpoint:
+                path = _route_paths[endpoint] = route.path
+                break
+        else:
+            return 'unmatched'
+    return f'{request.method} {path}'
+
+
+def sql_metrics_middleware(metrics: RequestMetrics):
+    async def middleware(request, call_next):
+        start = time.perf_counter()
+        with collect_query_stats() as stats:
+            response = await call_next(request)
+        latency = time.perf_counter() - start
+        # Streamed responses (the NDJSON exports) only count what ran before the first byte.
+        response.headers['X-DB-Queries'] = str(stats.statements)
+        response.headers['X-DB-Time-ms'] = f'{stats.db_time * 1000:.3f}'
+        response.headers['X-DB-Rows'] = str(stats.rows)
+        metrics.observe(route_name(request), latency, stats)
+        return response
+
+    return middleware
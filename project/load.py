@@ -0,0 +1,191 @@
+"""Bulk loader for teams, heroes and hero-team links.
+
+    python -m project.load sqlite:///database.db --teams teams.csv --heroes heroes.ndjson
+    python -m project.load sqlite:///many_to_many.db --teams teams.csv --links links.csv
+
+Files are CSV or NDJSON (picked by extension) with one row per line, keyed by column name.
+Hero and link rows can name their team with `team` instead of `team_id`. Loading heroes into
+the app's schema also refreshes the stats and the versions of their teams.
+"""
+import argparse
+import csv
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterable, Iterator, Optional
+
+from sqlalchemy import Integer, MetaData, Table, delete, func, insert, inspect, select, update
+
+from .bulk import MAX_PARAMETERS, batched
+from .database import create_db_engine
+
+
+DEFAULT_LOAD_BATCH_SIZE = 10_000
+
+# Durability is not needed while loading: if the load dies, it is simply run again.
+LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "cache_size": -256 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+def read_rows(path: str) -> Iterator[dict]:
+    with open(path, newline="") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(f):
+                # CSV has no NULL, an empty cell means "no value".
+                yield {key: (value if value != "" else None) for key, value in row.items()}
+
+
+def coerce_rows(table: Table, rows: Iterable[dict], team_ids: Optional[Dict[str, int]] = None) -> Iterator[dict]:
+    integer_columns = {column.name for column in table.columns if isinstance(column.type, Integer)}
+    for row in rows:
+        row = dict(row)
+        if "team" in row and team_ids is not None:
+            team_name = row.pop("team")
+            if team_name is not None:
+                try:
+                    row["team_id"] = team_ids[team_name]
+                except KeyError:
+                    raise ValueError(f"Unknown team: {team_name!r}")
+        unknown = set(row) - set(table.columns.keys())
+        if unknown:
+            raise ValueError(f"Unknown columns for {table.name}: {', '.join(sorted(unknown))}")
+        for name in integer_columns & set(row):
+            if row[name] is not None:
+                row[name] = int(row[name])
+        yield row
+
+
+@contextmanager
+def relaxed_pragmas(conn, pragmas: Dict[str, object] = LOAD_PRAGMAS):
+    previous = {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in pragmas}
+    for name, value in pragmas.items():
+        conn.exec_driver_sql(f"PRAGMA {name}={value}")
+    conn.commit()
+    try:
+        yield
+    finally:
+        conn.rollback()
+        for name, value in previous.items():
+            conn.exec_driver_sql(f"PRAGMA {name}={value}")
+        conn.commit()
+
+
+def load_table(conn, table: Table, rows: Iterable[dict], *, batch_size: int = DEFAULT_LOAD_BATCH_SIZE) -> int:
+    # One executemany() per batch, all of a file in one transaction. If anything fails the
+    # connection is closed without a commit, which rolls the file back.
+    count = 0
+    statement = insert(table)
+    for batch in batched(rows, batch_size):
+        conn.execute(statement, batch)
+        count += len(batch)
+    conn.commit()
+    return count
+
+
+def collect_team_ids(rows: Iterable[dict], team_ids: set) -> Iterator[dict]:
+    for row in rows:
+        if row.get("team_id") is not None:
+            team_ids.add(row["team_id"])
+        yield row
+
+
+def refresh_teams(conn, metadata: MetaData, team_ids: Iterable[int]):
+    # The app schema keeps per-team stats (teamstats) and a version per team (its ETag), which
+    # the app's hero writes maintain and a load bypasses: the stats of the teams that got
+    # heroes are recomputed from hero, and their versions bumped. Schemas without them are left alone.
+    team, hero, stats = metadata.tables["team"], metadata.tables["hero"], metadata.tables.get("teamstats")
+    for batch in batched(sorted(team_ids), MAX_PARAMETERS):
+        if stats is not None:
+            conn.execute(delete(stats).where(stats.c.team_id.in_(batch)))
+            conn.execute(insert(stats).from_select(
+                ["team_id", "hero_count", "age_count", "age_sum", "min_age", "max_age"],
+                select(
+                    hero.c.team_id,
+                    func.count(),
+                    func.count(hero.c.age),
+                    func.coalesce(func.sum(hero.c.age), 0),
+                    func.min(hero.c.age),
+                    func.max(hero.c.age),
+                ).where(hero.c.team_id.in_(batch)).group_by(hero.c.team_id),
+            ))
+        if "version" in team.c:
+            conn.execute(update(team).where(team.c.id.in_(batch)).values(version=team.c.version + 1))
+    conn.commit()
+
+
+def team_name_map(conn, team: Table) -> Dict[str, int]:
+    return {name: team_id for team_id, name in conn.execute(select(team.c.id, team.c.name))}
+
+
+def load(
+    url: str,
+    *,
+    teams: Optional[str] = None,
+    heroes: Optional[str] = None,
+    links: Optional[str] = None,
+    link_table: str = "heroteamassociation",
+    batch_size: int = DEFAULT_LOAD_BATCH_SIZE,
+    relax: bool = True,
+    report=print,
+) -> Dict[str, int]:
+    engine = create_db_engine(url)
+    metadata = MetaData()
+    # The tables are reflected, so the same loader works for the one-to-many app schema
+    # (hero.team_id) and for the many-to-many example (link table).
+    only = ["team"] + (["hero"] if heroes else []) + ([link_table] if links else [])
+    if heroes and "teamstats" in inspect(engine).get_table_names():
+        only.append("teamstats")
+    metadata.reflect(bind=engine, only=only)
+    counts = {}
+    with engine.connect() as conn, (relaxed_pragmas(conn) if relax else nullcontext()):
+        team_ids = None
+        for name, path in (("team", teams), ("hero", heroes), (link_table, links)):
+            if not path:
+                continue
+            table = metadata.tables[name]
+            if name != "team" and team_ids is None:
+                team_ids = team_name_map(conn, metadata.tables["team"])
+            start = time.perf_counter()
+            rows = coerce_rows(table, read_rows(path), team_ids)
+            if name == "hero":
+                loaded_team_ids = set()
+                rows = collect_team_ids(rows, loaded_team_ids)
+            counts[name] = load_table(conn, table, rows, batch_size=batch_size)
+            if name == "hero":
+                refresh_teams(conn, metadata, loaded_team_ids)
+            elapsed = time.perf_counter() - start
+            report(f"{name}: {counts[name]} rows in {elapsed:.2f}s ({counts[name] / max(elapsed, 1e-9):,.0f} rows/s)")
+    engine.dispose()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load teams, heroes and hero-team links.")
+    parser.add_argument("url", help="database URL, e.g. sqlite:///database.db")
+    parser.add_argument("--teams", help="CSV/NDJSON file of team rows")
+    parser.add_argument("--heroes", help="CSV/NDJSON file of hero rows")
+    parser.add_argument("--links", help="CSV/NDJSON file of hero-team link rows")
+    parser.add_argument("--link-table", default="heroteamassociation")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_LOAD_BATCH_SIZE)
+    parser.add_argument("--no-relax", dest="relax", action="store_false", help="keep the normal pragmas while loading")
+    args = parser.parse_args(argv)
+    load(
+        args.url,
+        teams=args.teams,
+        heroes=args.heroes,
+        links=args.links,
+        link_table=args.link_table,
+        batch_size=args.batch_size,
+        relax=args.relax,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+from functools import lru_cache
+from typing import Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload
+
+
+@lru_cache(maxsize=None)
+def eager_options(model, response_model) -> Tuple:
+    # Build loader options for every relationship that `response_model` serializes, so
+    # nothing is lazy loaded after the handler returns. Collections get a selectinload
+    # (one extra SELECT ... WHERE fk IN (...)), many-to-one attributes are joined in.
+    options = []
+    for name, relationship in inspect(model).relationships.items():
+        field = response_model.__fields__.get(name)
+        if field is None:
+            continue
+        loader = selectinload if relationship.uselist else joinedload
+        option = loader(getattr(model, name))
+        nested = eager_options(relationship.mapper.class_, field.type_) if hasattr(field.type_, '__fields__') else ()
+        if nested:
+            option = option.options(*nested)
+        options.append(option)
+    return tuple(options)
+
+
+def response_columns(model, response_model, *extra: str) -> list:
+    # The columns of `model` that `response_model` serializes (plus `extra` ones the handler
+    # needs, e.g. a version for the ETag), for a select() that returns plain rows: Row objects
+    # are tuples with attribute access, they skip the identity map and the instance state.
+    table = inspect(model).local_table
+    return [table.c[name] for name in list(response_model.__fields__) + list(extra) if name in table.c]
@@ -1,17 +1,21 @@
 from typing import List, Optional
 
-from fastapi import Depends, FastAPI, HTTPException, Query
-from sqlmodel import Field, Session, SQLModel, create_engine, select
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
+from sqlmodel import Field, Session, SQLModel, select
+
+from .bulk import insert_row
+from .database import create_db_engine
+from .pagination import CURSOR_HEADER, next_cursor, paginate
 
 
 class HeroBase(SQLModel):
-    name: str
-    secret_name: str
-    age: Optional[int] = None
+    name: str = Field(index=True)
+    secret_name: str = Field(index=False)
+    age: Optional[int] = Field(default=None, index=True)
 
 
 class Hero(HeroBase, table=True):
-    id: Optional[int] = Field(default=None, primary_key=True)
+    id: Optional[int] = Field(default=None, primary_key=True, index=False)
 
 
 class HeroCreate(HeroBase):
@@ -31,8 +35,7 @@ class HeroUpdate(SQLModel):
 sqlite_file_name = "database.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, echo=True, connect_args=connect_args)
+engine = create_db_engine(sqlite_url)
 
 
 def create_db_and_tables():
@@ -54,21 +57,31 @@ def on_startup():
 
 @app.post("/heroes/", response_model=HeroRead)
 def create_hero(*, session: Session = Depends(get_session), hero: HeroCreate):
-    db_hero = Hero.from_orm(hero)
-    session.add(db_hero)
+    hero_data = hero.dict()
+    hero_id = insert_row(session, Hero, hero_data)
     session.commit()
-    session.refresh(db_hero)
-    return db_hero
+    return HeroRead(id=hero_id, **hero_data)
 
 
 @app.get("/heroes/", response_model=List[HeroRead])
 def read_heroes(
     *,
     session: Session = Depends(get_session),
+    response: Response,
     offset: int = 0,
     limit: int = Query(default=100, lte=100),
+    after: Optional[str] = None,
 ):
-    heroes = session.exec(select(Hero).offset(offset).limit(limit)).all()
+    try:
+        statement = paginate(
+            select(Hero), Hero.id, after=after, offset=offset, limit=limit
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    heroes = session.exec(statement).all()
+    cursor = next_cursor(heroes, limit)
+    if cursor:
+        response.headers[CURSOR_HEADER] = cursor
     return heroes
 
 
@@ -0,0 +1,58 @@
+import base64
+import json
+from typing import Optional
+
+from sqlalchemy import bindparam
+from sqlmodel import col
+
+
+CURSOR_HEADER = 'X-Next-Cursor'
+# The smallest SQLite rowid: the `after` of a first page in prebuilt_page().
+FIRST_ID = -(2 ** 63)
+
+
+def encode_cursor(last_id: int) -> str:
+    # The token is opaque for clients, it only carries the last id they have seen.
+    raw = json.dumps({'id': last_id}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> int:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))['id']
+    except (ValueError, TypeError, KeyError):
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    return last_id
+
+
+def paginate(statement, id_column, *, after: Optional[str] = None, offset: int = 0, limit: int = 100):
+    # Keyset pagination: with a cursor SQLite seeks straight to the next id through the
+    # primary key instead of scanning and throwing away `offset` rows.
+    if after is not None:
+        statement = statement.where(col(id_column) > decode_cursor(after))
+    return statement.order_by(id_column).offset(offset).limit(limit)
+
+
+def prebuilt_page(statement, id_column):
+    # paginate() with every value left as a bound parameter, so the statement can be built
+    # once at import time and executed with page_params().
+    return (
+        statement.where(col(id_column) > bindparam('after'))
+        .order_by(id_column)
+        .offset(bindparam('offset'))
+        .limit(bindparam('limit'))
+    )
+
+
+def page_params(*, after: Optional[str] = None, offset: int = 0, limit: int = 100) -> dict:
+    return {'after': FIRST_ID if after is None else decode_cursor(after), 'offset': offset, 'limit': limit}
+
+
+def next_cursor(rows, limit: int, *, key: str = 'id') -> Optional[str]:
+    # A short page means there is nothing left to read.
+    if not rows or len(rows) < limit:
+        return None
+    return encode_cursor(getattr(rows[-1], key))
@@ -0,0 +1,52 @@
+import json
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Tuple
+
+from fastapi.responses import JSONResponse
+from pydantic.fields import SHAPE_SINGLETON
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional, the stdlib encoder is the fallback
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(',', ':'), ensure_ascii=False, default=_default).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    # Returning a Response from a handler makes FastAPI skip the response_model validation
+    # and jsonable_encoder, while the declared response_model still documents the schema.
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=None)
+def _fields(response_model) -> Tuple:
+    fields = []
+    for name, field in response_model.__fields__.items():
+        nested = field.type_ if hasattr(field.type_, '__fields__') else None
+        fields.append((name, nested, field.shape != SHAPE_SINGLETON))
+    return tuple(fields)
+
+
+def dump_model(obj, response_model) -> dict:
+    # Copies the attributes `response_model` declares straight off a (trusted) DB row or
+    # ORM object, recursing into nested models, without running Pydantic validation.
+    data = {}
+    for name, nested, many in _fields(response_model):
+        value = getattr(obj, name)
+        if nested is not None and value is not None:
+            value = [dump_model(item, nested) for item in value] if many else dump_model(value, nested)
+        data[name] = value
+    return data
@@ -0,0 +1,109 @@
+import zlib
+from typing import Callable, Iterable, List, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlmodel import Session
+
+
+def schema_version(metadata, dialect) -> int:
+    # A fingerprint of the DDL the models would emit: it changes with any table, column or
+    # index change, without anyone having to remember to bump a number. SQLite's
+    # user_version is a signed 32-bit integer, 0 being a database that never had one.
+    ddl = []
+    for table in metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=dialect)))
+        ddl.extend(str(CreateIndex(index).compile(dialect=dialect)) for index in sorted(table.indexes, key=lambda index: index.name))
+    return zlib.crc32('\n'.join(ddl).encode()) & 0x7FFFFFFF or 1
+
+
+def ensure_schema(conn, metadata, create: Callable[[object], None]) -> bool:
+    # One PRAGMA read when the database is up to date, instead of create_all() reflecting
+    # every table on each boot. Otherwise create(conn) runs the DDL and the version is stored
+    # in the same transaction. Returns whether the DDL ran.
+    version = schema_version(metadata, conn.dialect)
+    if conn.exec_driver_sql('PRAGMA user_version').scalar() == version:
+        return False
+    create(conn)
+    conn.exec_driver_sql(f'PRAGMA user_version = {version}')
+    return True
+
+
+def add_missing_columns(conn, metadata):
+    # create_all() leaves existing tables alone, this adds the columns the models gained
+    # since. They need a server default (or to be nullable) to fill the existing rows.
+    inspector = inspect(conn)
+    compiler = conn.dialect.ddl_compiler(conn.dialect, None)
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                table_name = conn.dialect.identifier_preparer.format_table(table)
+                conn.exec_driver_sql(f'ALTER TABLE {table_name} ADD COLUMN {compiler.get_column_specification(column)}')
+
+
+def add_autoincrement(conn, metadata) -> List[str]:
+    # Without AUTOINCREMENT SQLite hands out the largest rowid again once it is deleted, and
+    # that can't be added with ALTER TABLE: the existing tables the models declare
+    # sqlite_autoincrement for are rebuilt (create the new table, copy the rows, drop the old
+    # one, rename the new one) and get their indexes back. The old table's triggers are dropped
+    # with it, putting them back is up to the caller. Returns the names of the rebuilt tables.
+    preparer = conn.dialect.identifier_preparer
+    rebuilt = []
+    for table in metadata.sorted_tables:
+        if not table.dialect_options['sqlite']['autoincrement']:
+            continue
+        sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)).scalar()
+        if sql is None or 'AUTOINCREMENT' in sql.upper():
+            continue
+        name, new_name = preparer.format_table(table), preparer.quote(f'{table.name}_new')
+        create = str(CreateTable(table).compile(dialect=conn.dialect))
+        conn.exec_driver_sql(create.replace(f'CREATE TABLE {name} ', f'CREATE TABLE {new_name} ', 1))
+        columns = ', '.join(preparer.quote(column.name) for column in table.columns)
+        conn.exec_driver_sql(f'INSERT INTO {new_name} ({columns}) SELECT {columns} FROM {name}')
+        conn.exec_driver_sql(f'DROP TABLE {name}')
+        conn.exec_driver_sql(f'ALTER TABLE {new_name} RENAME TO {name}')
+        for index in table.indexes:
+            index.create(conn)
+        rebuilt.append(table.name)
+    return rebuilt
+
+
+# The rows ANALYZE reads per index (SQLite 3.32+), so it takes about as long on any table size.
+DEFAULT_ANALYSIS_LIMIT = 1000
+
+
+def update_statistics(conn, analysis_limit: int = DEFAULT_ANALYSIS_LIMIT):
+    # Without sqlite_stat1 the query planner guesses how many rows each index matches; with
+    # it, it can tell a selective index from one that matches most of the table, e.g. to
+    # search an index and sort rather than walk the table in id order for a page.
+    conn.exec_driver_sql(f'PRAGMA analysis_limit = {int(analysis_limit)}')
+    conn.exec_driver_sql('ANALYZE')
+
+
+def open_pool_connections(engine) -> int:
+    # Connects (and runs the connect-time PRAGMAs for) every connection the pool keeps,
+    # so the first requests don't pay for it.
+    pool = engine.pool
+    connections = [engine.connect() for _ in range(pool.size() if isinstance(pool, QueuePool) else 1)]
+    for connection in connections:
+        connection.close()
+    return len(connections)
+
+
+def warm_up(engine, statements: Iterable[Tuple[object, dict]]):
+    # Configures the mappers, fills the pool and runs every statement once so its compiled
+    # form is in the engine's cache. Everything runs in one transaction that is rolled back,
+    # so the statements can be writes.
+    configure_mappers()
+    open_pool_connections(engine)
+    with Session(engine) as session:
+        for statement, params in statements:
+            result = session.execute(statement, params)
+            if statement.is_select:
+                result.all()
+        session.rollback()
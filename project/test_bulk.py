@@ -0,0 +1,70 @@
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import registry
+from sqlmodel import Field, Session, SQLModel, create_engine, select
+
+from .bulk import delete_links, delete_links_by, insert_links
+
+
+class LinkModel(SQLModel, registry=registry()):
+    pass
+
+
+class HeroTeamLink(LinkModel, table=True):
+    team_id: Optional[int] = Field(default=None, primary_key=True)
+    hero_id: Optional[int] = Field(default=None, primary_key=True)
+
+
+def test_insert_and_delete_links():
+    engine = create_engine("sqlite://")
+    LinkModel.metadata.create_all(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+    with Session(engine) as session:
+        added = insert_links(session, HeroTeamLink, [{"team_id": 1, "hero_id": hero_id} for hero_id in range(1, 6)])
+        # Two of these already exist and are skipped.
+        added_again = insert_links(
+            session, HeroTeamLink, [{"team_id": 1, "hero_id": 4}, {"team_id": 1, "hero_id": 5}, {"team_id": 2, "hero_id": 1}]
+        )
+        # (3, 1) doesn't exist, it isn't counted.
+        removed = delete_links(
+            session, HeroTeamLink, [{"team_id": 1, "hero_id": 2}, {"team_id": 1, "hero_id": 3}, {"team_id": 3, "hero_id": 1}]
+        )
+        session.commit()
+
+        links = session.exec(
+            select(HeroTeamLink.team_id, HeroTeamLink.hero_id).order_by(HeroTeamLink.team_id, HeroTeamLink.hero_id)
+        ).all()
+
+    assert (added, added_again, removed) == (5, 1, 2)
+    assert links == [(1, 1), (1, 4), (1, 5), (2, 1)]
+    assert [statement.split()[0] for statement in statements[:3]] == ["INSERT", "INSERT", "DELETE"]
+    assert "IN (VALUES" in statements[2]
+
+
+def test_delete_links_in_batches():
+    engine = create_engine("sqlite://")
+    LinkModel.metadata.create_all(engine)
+    rows = [{"team_id": 1, "hero_id": hero_id} for hero_id in range(1000)]
+    with Session(engine) as session:
+        insert_links(session, HeroTeamLink, rows)
+        assert delete_links(session, HeroTeamLink, rows[:999], batch_size=450) == 999
+        assert session.exec(select(HeroTeamLink.hero_id)).all() == [999]
+
+
+def test_delete_links_by():
+    engine = create_engine("sqlite://")
+    LinkModel.metadata.create_all(engine)
+    statements = []
+    with Session(engine) as session:
+        insert_links(session, HeroTeamLink, [{"team_id": team_id, "hero_id": hero_id} for team_id in (1, 2) for hero_id in range(100)])
+        event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        removed = delete_links_by(session, HeroTeamLink, team_id=1)
+        session.commit()
+        left = session.exec(select(HeroTeamLink.team_id).distinct()).all()
+
+    assert removed == 100
+    assert left == [2]
+    assert [statement.split()[0] for statement in statements] == ["DELETE", "SELECT"]
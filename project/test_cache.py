@@ -0,0 +1,54 @@
+from .cache import EntityCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction():
+    cache = EntityCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = EntityCache(ttl=10, clock=clock)
+    cache.set("a", 1)
+    clock.now = 9
+    assert cache.get("a") == 1
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.stats() == {
+        "size": 0, "maxsize": 10_000, "hits": 1, "misses": 1, "evictions": 1, "invalidations": 0,
+    }
+
+
+def test_invalidate_cascades_to_dependents():
+    cache = EntityCache()
+    cache.set(("team", 1), "team")
+    cache.set(("hero", 1), "hero", depends_on=[("team", 1)])
+    cache.set(("hero", 2), "other hero")
+
+    cache.invalidate(("team", 1))
+
+    assert cache.get(("hero", 1)) is None
+    assert cache.get(("hero", 2)) == "other hero"
+
+
+def test_stale_set_is_skipped():
+    cache = EntityCache()
+    generation = cache.generation
+    cache.invalidate(("hero", 1))
+    cache.set(("hero", 1), "stale", generation=generation)
+    assert cache.get(("hero", 1)) is None
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from .coalescer import WriteCoalescer
+from .database import create_db_engine
+
+
+metadata = MetaData()
+hero = Table("hero", metadata, Column("id", Integer, primary_key=True), Column("name", String, unique=True))
+
+
+def insert_hero(name):
+    def operation(session):
+        return session.execute(insert(hero), {"name": name}).inserted_primary_key[0]
+    return operation
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    metadata.create_all(engine)
+    return engine
+
+
+def test_concurrent_writes_are_committed_in_batches(engine):
+    coalescer = WriteCoalescer(engine, max_batch_size=10, max_wait=0.05)
+    coalescer.start()
+    results = {}
+
+    def write(i):
+        results[i] = coalescer.run(insert_hero(f"Hero {i}"))
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    coalescer.stop()
+
+    assert sorted(results.values()) == list(range(1, 31))
+    with engine.connect() as conn:
+        assert conn.execute(select(hero.c.name).where(hero.c.id == results[7])).scalar() == "Hero 7"
+    assert coalescer.batch_sizes.sum == 30
+    assert coalescer.batch_sizes.count < 30
+    assert coalescer.commit_latency.count == coalescer.batch_sizes.count
+    assert 'write_batch_size_count{queue="writes"}' in coalescer.render()
+
+
+def test_a_failing_operation_fails_alone(engine):
+    coalescer = WriteCoalescer(engine, max_wait=0.05)
+    futures = [coalescer.submit(insert_hero(name)) for name in ("Deadpond", "Deadpond", "Rusty-Man")]
+    coalescer.start()
+    coalescer.stop()
+
+    assert futures[0].result() == 1
+    with pytest.raises(IntegrityError):
+        futures[1].result()
+    assert futures[2].result() == 2
+    assert coalescer.batch_sizes.count == 1
+    with engine.connect() as conn:
+        assert conn.execute(select(hero.c.name).order_by(hero.c.id)).scalars().all() == ["Deadpond", "Rusty-Man"]
@@ -0,0 +1,37 @@
+import random
+from typing import Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import registry
+from sqlmodel import Field, Session, SQLModel, create_engine
+
+from .counting import estimate_count
+
+
+class CountingModel(SQLModel, registry=registry()):
+    pass
+
+
+class Item(CountingModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    size: int = Field(index=True)
+
+
+def test_estimate_count():
+    engine = create_engine("sqlite://")
+    CountingModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        # Ids with gaps, a third of the items are small.
+        session.execute(insert(Item.__table__), [{"id": i * 3, "size": i % 3} for i in range(1, 6001)])
+        total = 6000
+
+        exact = estimate_count(session, select(Item.id).where(Item.size == 0).where(Item.id < 300), Item.id, total)
+        assert exact == (33, 0)
+
+        truth = session.execute(select(func.count()).where(Item.size == 0)).scalar_one()
+        for seed in range(5):
+            estimate, margin = estimate_count(
+                session, select(Item.id).where(Item.size == 0), Item.id, total, exact_limit=100, rng=random.Random(seed)
+            )
+            assert 0 < margin < total * 0.1
+            assert abs(estimate - truth) <= margin
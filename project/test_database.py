@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+from .database import create_db_engine, pool_stats
+
+
+def test_performance_profile_pragmas(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}", profile="performance")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert conn.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -64 * 1024
+    assert engine.echo is False
+
+
+def test_default_profile_keeps_sqlite_defaults(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}", profile="default")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 2  # FULL
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        create_db_engine("sqlite://", profile="turbo")
+
+
+def test_read_only_engine(tmp_path):
+    url = f"sqlite:///{tmp_path / 'database.db'}"
+    writer = create_db_engine(url, profile="performance", poolclass=QueuePool, pool_size=1, max_overflow=0)
+    with writer.begin() as conn:
+        conn.execute(text("CREATE TABLE hero (name)"))
+        conn.execute(text("INSERT INTO hero VALUES ('Deadpond')"))
+    reader = create_db_engine(url, profile="performance", read_only=True, poolclass=QueuePool, pool_size=2)
+
+    with reader.connect() as conn:
+        assert conn.execute(text("SELECT name FROM hero")).scalars().all() == ["Deadpond"]
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        with pytest.raises(OperationalError, match="readonly"):
+            conn.execute(text("INSERT INTO hero VALUES ('Rusty-Man')"))
+        assert pool_stats(reader) == {"pool": "QueuePool", "size": 2, "checked_in": 0, "checked_out": 1, "overflow": -1}
+    assert pool_stats(writer)["size"] == 1
+
+
+def test_read_only_engine_needs_a_file():
+    with pytest.raises(ValueError):
+        create_db_engine("sqlite://", read_only=True)
@@ -0,0 +1,81 @@
+import json
+
+from sqlalchemy import create_engine, text
+
+from .load import LOAD_PRAGMAS, load, relaxed_pragmas
+
+
+def create_tables(url):
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE team (id INTEGER PRIMARY KEY, name VARCHAR, headquarters VARCHAR)"))
+        conn.execute(text(
+            "CREATE TABLE hero (id INTEGER PRIMARY KEY, name VARCHAR, secret_name VARCHAR, age INTEGER, team_id INTEGER)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE heroteamassociation (team_id INTEGER, hero_id INTEGER, PRIMARY KEY (team_id, hero_id))"
+        ))
+    return engine
+
+
+def test_load_teams_heroes_and_links(tmp_path):
+    url = f"sqlite:///{tmp_path / 'database.db'}"
+    engine = create_tables(url)
+    teams = tmp_path / "teams.csv"
+    teams.write_text("name,headquarters\nPreventers,Sharp Tower\nZ-Force,Sister Margaret's Bar\n")
+    heroes = tmp_path / "heroes.ndjson"
+    heroes.write_text("\n".join(json.dumps(hero) for hero in [
+        {"id": 1, "name": "Deadpond", "secret_name": "Dive Wilson", "team": "Z-Force"},
+        {"id": 2, "name": "Rusty-Man", "secret_name": "Tommy Sharp", "age": 48, "team": "Preventers"},
+        {"id": 3, "name": "Spider-Boy", "secret_name": "Pedro Parqueador"},
+    ]))
+    links = tmp_path / "links.csv"
+    links.write_text("team,hero_id\nPreventers,1\nZ-Force,1\nPreventers,3\n")
+    reports = []
+
+    counts = load(url, teams=str(teams), heroes=str(heroes), links=str(links), batch_size=2, report=reports.append)
+
+    assert counts == {"team": 2, "hero": 3, "heroteamassociation": 3}
+    assert len(reports) == 3
+    with engine.connect() as conn:
+        assert conn.execute(text(
+            "SELECT hero.name, team.name FROM hero LEFT JOIN team ON team.id = hero.team_id ORDER BY hero.id"
+        )).all() == [("Deadpond", "Z-Force"), ("Rusty-Man", "Preventers"), ("Spider-Boy", None)]
+        assert conn.execute(text("SELECT count(*) FROM heroteamassociation")).scalar() == 3
+
+
+def test_relaxed_pragmas_are_restored(tmp_path):
+    # PRAGMAs are per connection: they are checked on the connection the loader relaxes.
+    engine = create_engine(f"sqlite:///{tmp_path / 'database.db'}", future=True)
+    with engine.connect() as conn:
+        before = {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in LOAD_PRAGMAS}
+        with relaxed_pragmas(conn):
+            assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 0
+            assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2
+        assert {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in LOAD_PRAGMAS} == before
+        assert before["synchronous"] != 0
+
+
+def test_load_heroes_refreshes_team_stats_and_versions(tmp_path):
+    url = f"sqlite:///{tmp_path / 'database.db'}"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE team (id INTEGER PRIMARY KEY, name VARCHAR, headquarters VARCHAR, version INTEGER)"))
+        conn.execute(text(
+            "CREATE TABLE hero (id INTEGER PRIMARY KEY, name VARCHAR, secret_name VARCHAR, age INTEGER, team_id INTEGER)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE teamstats (team_id INTEGER PRIMARY KEY, hero_count INTEGER, age_count INTEGER, age_sum INTEGER,"
+            " min_age INTEGER, max_age INTEGER)"
+        ))
+        conn.execute(text("INSERT INTO team VALUES (1, 'Preventers', 'Sharp Tower', 1), (2, 'Z-Force', 'Bar', 1)"))
+        conn.execute(text("INSERT INTO hero VALUES (1, 'Deadpond', 'Dive Wilson', 30, 1)"))
+        conn.execute(text("INSERT INTO teamstats VALUES (1, 1, 1, 30, 30, 30)"))
+    heroes = tmp_path / "heroes.csv"
+    heroes.write_text("name,secret_name,age,team\nRusty-Man,Tommy Sharp,48,Preventers\nSpider-Boy,Pedro Parqueador,,Preventers\n")
+
+    load(url, heroes=str(heroes), report=lambda message: None)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT * FROM teamstats")).all() == [(1, 3, 2, 78, 30, 48)]
+        assert conn.execute(text("SELECT id, version FROM team ORDER BY id")).all() == [(1, 2), (2, 1)]
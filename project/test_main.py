@@ -157,3 +157,29 @@ def test_delete_hero(session: Session, client: TestClient):
     assert response.status_code == 200
 
     assert hero_in_db is None
+
+
+def test_read_heroes_with_cursor(session: Session, client: TestClient):
+    heroes = [Hero(name=f"Hero {i}", secret_name=f"Secret {i}") for i in range(5)]
+    for hero in heroes:
+        session.add(hero)
+    session.commit()
+
+    response = client.get("/heroes/", params={"limit": 2})
+    assert response.status_code == 200
+    assert [hero["name"] for hero in response.json()] == ["Hero 0", "Hero 1"]
+
+    seen = []
+    cursor = response.headers["X-Next-Cursor"]
+    while cursor:
+        response = client.get("/heroes/", params={"limit": 2, "after": cursor})
+        assert response.status_code == 200
+        seen.extend(hero["name"] for hero in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+
+    assert seen == ["Hero 2", "Hero 3", "Hero 4"]
+
+
+def test_read_heroes_invalid_cursor(client: TestClient):
+    response = client.get("/heroes/", params={"after": "not-a-cursor"})
+    assert response.status_code == 400
@@ -0,0 +1,108 @@
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table, insert, inspect, select
+from sqlalchemy.pool import QueuePool
+
+from .database import create_db_engine, pool_stats
+from .instrumentation import track_statement_cache
+from .startup import add_autoincrement, add_missing_columns, ensure_schema, schema_version, update_statistics, warm_up
+
+
+def hero_metadata(*indexes) -> MetaData:
+    metadata = MetaData()
+    table = Table("hero", metadata, Column("id", Integer, primary_key=True), Column("name", String), Column("age", Integer))
+    for column in indexes:
+        Index(f"ix_hero_{column}", table.c[column])
+    return metadata
+
+
+def test_schema_version_follows_the_ddl(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    versions = {
+        schema_version(metadata, engine.dialect) for metadata in (hero_metadata(), hero_metadata("name"), hero_metadata("age"))
+    }
+    assert len(versions) == 3
+    assert schema_version(hero_metadata("name"), engine.dialect) in versions
+
+
+def test_ensure_schema_skips_the_ddl_when_up_to_date(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    created = []
+
+    def create(conn):
+        created.append(metadata)
+        metadata.create_all(conn)
+
+    metadata = hero_metadata()
+    for _ in range(2):
+        with engine.begin() as conn:
+            ensure_schema(conn, metadata, create)
+    assert len(created) == 1
+
+    metadata = hero_metadata("name")
+    with engine.begin() as conn:
+        assert ensure_schema(conn, metadata, create) is True
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar() == schema_version(metadata, conn.dialect)
+    assert len(created) == 2
+
+
+def test_update_statistics(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    metadata = hero_metadata("age")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(metadata.tables["hero"]), [{"name": f"Hero {i}", "age": i % 3} for i in range(30)])
+        update_statistics(conn)
+        # 30 rows, about 10 of them per age.
+        assert conn.exec_driver_sql("SELECT stat FROM sqlite_stat1 WHERE idx = 'ix_hero_age'").scalar() == "30 10"
+
+
+def test_warm_up(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}", poolclass=QueuePool, pool_size=3)
+    metadata = hero_metadata()
+    metadata.create_all(engine)
+    hero = metadata.tables["hero"]
+    statements = [(select(hero).where(hero.c.id == 1), {}), (insert(hero), {"name": "Deadpond", "age": 30})]
+
+    warm_up(engine, statements)
+
+    assert pool_stats(engine)["checked_in"] == 3
+    cache = track_statement_cache(engine)
+    with engine.begin() as conn:
+        assert conn.execute(select(hero)).all() == []  # the warm-up insert was rolled back
+        conn.execute(select(hero).where(hero.c.id == 2))
+        conn.execute(insert(hero), {"name": "Rusty-Man", "age": 48})
+    # Only the unfiltered select wasn't part of the warm-up.
+    assert (cache.misses, cache.hits) == (1, 2)
+
+
+def test_add_missing_columns(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    hero_metadata().create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(hero_metadata().tables["hero"]), {"name": "Deadpond"})
+    metadata = hero_metadata()
+    Table("hero", metadata, Column("version", Integer, nullable=False, server_default="1"), extend_existing=True)
+
+    with engine.begin() as conn:
+        add_missing_columns(conn, metadata)
+        assert conn.execute(select(metadata.tables["hero"].c.version)).scalars().all() == [1]
+
+
+def test_add_autoincrement(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    hero_metadata("name").create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(hero_metadata().tables["hero"]), [{"name": "Deadpond"}, {"name": "Rusty-Man"}])
+        conn.exec_driver_sql("DELETE FROM hero WHERE id = 2")
+    metadata = hero_metadata("name")
+    metadata.tables["hero"].dialect_options["sqlite"]["autoincrement"] = True
+
+    with engine.begin() as conn:
+        assert add_autoincrement(conn, metadata) == ["hero"]
+        assert add_autoincrement(conn, metadata) == []
+        hero = metadata.tables["hero"]
+        assert conn.execute(select(hero.c.id, hero.c.name)).all() == [(1, "Deadpond")]
+        conn.execute(insert(hero), {"name": "Spider-Boy"})
+        conn.exec_driver_sql("DELETE FROM hero WHERE id = 2")
+        # The id of a deleted row is never handed out again.
+        assert conn.execute(insert(hero), {"name": "Spider-Boy"}).inserted_primary_key[0] == 3
+        assert [index["name"] for index in inspect(conn).get_indexes("hero")] == ["ix_hero_name"]
@@ -0,0 +1,107 @@
+import sys
+from typing import Optional
+
+from sqlalchemy import bindparam, insert, select as sa_select
+from sqlmodel import col, or_, select
+
+from models import AppModel, Hero, HeroCreate, HeroRead, HeroReadWithTeam, Team, TeamCreate, TeamRead, TeamReadWithHeroes
+from project.advisor import report
+from project.database import create_db_engine
+from project.loading import eager_options, response_columns
+from project.pagination import page_params, prebuilt_page
+
+
+# The queries the app and the examples run, with representative parameters. The index
+# advisor (`python queries.py [database url]`) checks that none of them scans a table.
+CANONICAL_QUERIES = {
+    'hero by name': select(Hero).where(Hero.name == 'Deadpond'),
+    'young heroes': select(Hero).where(col(Hero.age) >= 35, col(Hero.age) < 40),
+    'youngest or oldest heroes': select(Hero).where(or_(col(Hero.age) <= 35, col(Hero.age) > 90)),
+    'team heroes': select(Hero).where(Hero.team_id == 1),
+    'team heroes by age': select(Hero).where(Hero.team_id == 1, col(Hero.age) >= 30),
+    'heroes from aqua': select(Hero, Team).join(Team).where(Team.headquarters == 'Aqua World'),
+    'team by name': select(Team).where(Team.name == 'Preventers'),
+}
+
+
+# The statements of the hot read endpoints, built once. A statement object memoizes its
+# cache key, so executing one of these skips building the select() and generating its key
+# on every request, and finds its compiled form in the engine's cache.
+# They use SQLAlchemy's select(): SQLModel's Select subclasses don't declare inherit_cache,
+# so SQLAlchemy never caches their compiled SQL. Execute them with session.execute(...).scalars().
+HERO_BY_ID = sa_select(Hero).where(Hero.id == bindparam('hero_id')).options(*eager_options(Hero, HeroReadWithTeam))
+TEAM_BY_ID = sa_select(Team).where(Team.id == bindparam('team_id')).options(*eager_options(Team, TeamReadWithHeroes))
+HEROES_PAGE = prebuilt_page(sa_select(Hero), Hero.id)
+TEAMS_PAGE = prebuilt_page(sa_select(Team), Team.id)
+# The list endpoints only need the HeroRead/TeamRead columns and the version for the ETag:
+# selecting them alone returns plain rows instead of ORM entities (LIST_MODE=rows).
+HERO_ROW_COLUMNS = response_columns(Hero, HeroRead, 'version')
+TEAM_ROW_COLUMNS = response_columns(Team, TeamRead, 'version')
+HERO_ROWS_PAGE = prebuilt_page(sa_select(*HERO_ROW_COLUMNS), Hero.id)
+TEAM_ROWS_PAGE = prebuilt_page(sa_select(*TEAM_ROW_COLUMNS), Team.id)
+# Conditional GETs: the versions behind a hero's or a team's ETag, one primary key lookup.
+HERO_VERSION = sa_select(Hero.version, Team.version).outerjoin(Team, Team.id == Hero.team_id).where(Hero.id == bindparam('hero_id'))
+TEAM_VERSION = sa_select(Team.version).where(Team.id == bindparam('team_id'))
+
+# One execution of each hot statement, for project.startup.warm_up(). The inserts have the
+# keys of HeroCreate/TeamCreate.dict() so they compile to the same SQL as the create endpoints.
+WARM_UP_READS = [
+    (HERO_BY_ID, {'hero_id': 0}),
+    (TEAM_BY_ID, {'team_id': 0}),
+    (HEROES_PAGE, page_params()),
+    (TEAMS_PAGE, page_params()),
+    (HERO_ROWS_PAGE, page_params()),
+    (TEAM_ROWS_PAGE, page_params()),
+]
+WARM_UP_WRITES = [
+    (insert(Hero.__table__), HeroCreate(name='', secret_name='').dict()),
+    (insert(Team.__table__), TeamCreate(name='', headquarters='').dict()),
+]
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    # The smallest string above every string that starts with `prefix`: the prefix with its
+    # last character incremented, dropping trailing U+10FFFF (it has no successor) and skipping
+    # the surrogates (they aren't valid in UTF-8). None when there is no such string.
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    code = ord(prefix[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        code = 0xE000
+    return prefix[:-1] + chr(code)
+
+
+def filter_heroes(
+    statement,
+    *,
+    min_age: Optional[int] = None,
+    max_age: Optional[int] = None,
+    name_prefix: Optional[str] = None,
+    team_id: Optional[int] = None,
+    headquarters: Optional[str] = None
+):
+    # Every filter maps to an indexed column: ix_hero_age, ix_hero_name, the (team_id, age)
+    # composite, and ix_team_headquarters through a join that is only added when needed.
+    if min_age is not None:
+        statement = statement.where(col(Hero.age) >= min_age)
+    if max_age is not None:
+        statement = statement.where(col(Hero.age) <= max_age)
+    if name_prefix:
+        # A range instead of LIKE 'prefix%': SQLite's LIKE is case insensitive and can't use the
+        # (binary collated) name index, the range can. The match is case sensitive.
+        statement = statement.where(col(Hero.name) >= name_prefix)
+        upper_bound = prefix_upper_bound(name_prefix)
+        if upper_bound is not None:
+            statement = statement.where(col(Hero.name) < upper_bound)
+    if team_id is not None:
+        statement = statement.where(Hero.team_id == team_id)
+    if headquarters is not None:
+        statement = statement.join(Team, Hero.team_id == Team.id).where(Team.headquarters == headquarters)
+    return statement
+
+
+if __name__ == '__main__':
+    engine = create_db_engine(sys.argv[1] if len(sys.argv) > 1 else 'sqlite:///database.db')
+    AppModel.metadata.create_all(engine)
+    sys.exit(1 if report(engine, AppModel.metadata, CANONICAL_QUERIES) else 0)
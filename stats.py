@@ -0,0 +1,138 @@
+import sys
+from collections import defaultdict
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, inspect, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from models import COUNTED_MODELS, AppModel, Hero, RowCount, Team, TeamStats, TeamStatsRead, row_count_triggers
+from project.database import create_db_engine
+
+
+# (team_id, age) of a hero before or after a write, None when the hero doesn't exist on that side.
+HeroState = Optional[Tuple[Optional[int], Optional[int]]]
+
+
+def record_hero_changes(session: Session, changes: Iterable[Tuple[HeroState, HeroState]]):
+    # Call it after the hero rows are written, in the same transaction. Counts and the age sum
+    # move by the difference, min/max are read back from the (team_id, age) index, which is
+    # two index seeks per team instead of a pass over its heroes.
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for before, after in changes:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is None or state[0] is None:
+                continue
+            team_id, age = state
+            delta = deltas[team_id]
+            delta[0] += sign
+            if age is not None:
+                delta[1] += sign
+                delta[2] += sign * age
+    table = TeamStats.__table__
+    for team_id, (hero_count, age_count, age_sum) in deltas.items():
+        statement = sqlite_insert(TeamStats.__table__).values(
+            team_id=team_id,
+            hero_count=hero_count,
+            age_count=age_count,
+            age_sum=age_sum,
+            min_age=select(func.min(Hero.age)).where(Hero.team_id == team_id).scalar_subquery(),
+            max_age=select(func.max(Hero.age)).where(Hero.team_id == team_id).scalar_subquery(),
+        )
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.team_id],
+            set_={
+                'hero_count': table.c.hero_count + statement.excluded.hero_count,
+                'age_count': table.c.age_count + statement.excluded.age_count,
+                'age_sum': table.c.age_sum + statement.excluded.age_sum,
+                'min_age': statement.excluded.min_age,
+                'max_age': statement.excluded.max_age,
+            },
+        ))
+
+
+def record_hero_change(session: Session, before: HeroState, after: HeroState):
+    record_hero_changes(session, [(before, after)])
+
+
+def recompute_team_stats(session: Session) -> int:
+    # Rebuilds the whole table from hero with one GROUP BY, to repair it or to fill it on a
+    # database that had heroes before the table existed.
+    table = TeamStats.__table__
+    session.execute(delete(table))
+    columns = select(
+        Hero.team_id,
+        func.count(),
+        func.count(Hero.age),
+        func.coalesce(func.sum(Hero.age), 0),
+        func.min(Hero.age),
+        func.max(Hero.age),
+    ).where(Hero.team_id != None).group_by(Hero.team_id)  # noqa: E711
+    result = session.execute(insert(table).from_select(
+        ['team_id', 'hero_count', 'age_count', 'age_sum', 'min_age', 'max_age'], columns
+    ))
+    return result.rowcount
+
+
+def stats_statement():
+    # Teams without heroes have no stats row yet, the outer join reports them as empty.
+    return select(
+        Team.id, TeamStats.hero_count, TeamStats.age_count, TeamStats.age_sum, TeamStats.min_age, TeamStats.max_age
+    ).outerjoin(TeamStats, TeamStats.team_id == Team.id)
+
+
+def stats_read(row) -> TeamStatsRead:
+    team_id, hero_count, age_count, age_sum, min_age, max_age = row
+    return TeamStatsRead(
+        team_id=team_id,
+        hero_count=hero_count or 0,
+        average_age=age_sum / age_count if age_count else None,
+        min_age=min_age,
+        max_age=max_age,
+    )
+
+
+def read_row_count(session: Session, model) -> int:
+    row_count = session.execute(
+        select(RowCount.row_count).where(RowCount.table_name == model.__tablename__)
+    ).scalar_one_or_none()
+    return row_count or 0
+
+
+def recount_rows(session: Session):
+    # One COUNT(*) per table, to repair the counts or to fill them in on an existing database.
+    table = RowCount.__table__
+    session.execute(delete(table))
+    for model in COUNTED_MODELS:
+        session.execute(insert(table).from_select(
+            ['table_name', 'row_count'], select(literal(model.__tablename__), func.count()).select_from(model)
+        ))
+
+
+def create_maintained_tables(engine):
+    # Run before create_all(): a database that had heroes before the stats or the row count
+    # table existed gets them filled in, instead of empty ones that would never add up.
+    existing = set(inspect(engine).get_table_names())
+    missing = [(table, fill) for table, fill in ((TeamStats, recompute_team_stats), (RowCount, recount_rows))
+               if table.__tablename__ not in existing]
+    if missing:
+        AppModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        # The triggers are IF NOT EXISTS: this puts back the ones of a rebuilt table
+        # (project.startup.add_autoincrement()), the rows it copied were already counted.
+        for model in COUNTED_MODELS:
+            for trigger in row_count_triggers(model.__tablename__):
+                session.execute(trigger)
+        for _, fill in missing:
+            fill(session)
+        session.commit()
+
+
+if __name__ == '__main__':
+    engine = create_db_engine(sys.argv[1] if len(sys.argv) > 1 else 'sqlite:///database.db')
+    AppModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        teams = recompute_team_stats(session)
+        recount_rows(session)
+        session.commit()
+    print(f'Recomputed the stats of {teams} teams and the row counts')
@@ -0,0 +1,751 @@
+import json
+from contextlib import contextmanager
+from itertools import combinations
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, inspect, text
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateTable
+from sqlmodel import Session, create_engine, select
+from sqlmodel.pool import StaticPool
+
+import app as app_module
+from app import app, entity_cache, get_session
+from models import AppModel, Hero, HeroUpdate, Team, TeamStats, TeamUpdate
+from queries import CANONICAL_QUERIES, filter_heroes
+from stats import create_maintained_tables, read_row_count, recompute_team_stats
+from project.advisor import ensure_indexes, find_scans, undeclared_indexes
+from project.coalescer import WriteCoalescer
+from project.database import create_db_engine, pool_stats
+from project.instrumentation import CountingConnection, instrument_engine, track_statement_cache
+from project.pagination import FIRST_ID, encode_cursor, paginate
+
+
+@pytest.fixture(name='engine')
+def engine_fixture():
+    engine = create_engine(
+        'sqlite://',
+        connect_args={'check_same_thread': False, 'factory': CountingConnection},
+        poolclass=StaticPool,
+    )
+    instrument_engine(engine)
+    AppModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture(name='session')
+def session_fixture(engine):
+    with Session(engine) as session:
+        yield session
+
+
+@contextmanager
+def count_statements(engine):
+    # Records every statement sent to the database, including the lazy loads that would
+    # happen while FastAPI serializes the response.
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@contextmanager
+def record_lazy_loads(session: Session):
+    # Guard for N+1 queries: any relationship that the handler didn't load up front is
+    # lazy loaded from an instance while the response model is being serialized.
+    lazy_loads = []
+
+    def do_orm_execute(orm_execute_state):
+        if orm_execute_state.lazy_loaded_from is not None:
+            lazy_loads.append(orm_execute_state.statement)
+
+    event.listen(session, 'do_orm_execute', do_orm_execute)
+    try:
+        yield lazy_loads
+    finally:
+        event.remove(session, 'do_orm_execute', do_orm_execute)
+
+
+@pytest.fixture(name='client')
+def client_fixture(session: Session):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    entity_cache.clear()
+    client = TestClient(app)
+    yield client
+    app.dependency_overrides.clear()
+
+
+def test_create_heroes_bulk(session: Session, client: TestClient):
+    session.add(Hero(name='Deadpond', secret_name='Dive Wilson'))
+    session.commit()
+
+    heroes = [{'name': f'Hero {i}', 'secret_name': f'Secret {i}', 'age': i} for i in range(5)]
+    response = client.post('/heroes/bulk', params={'batch_size': 2}, json=heroes)
+    ids = response.json()
+
+    assert response.status_code == 200
+    assert ids == [2, 3, 4, 5, 6]
+    for hero_id, hero in zip(ids, heroes):
+        assert session.get(Hero, hero_id).name == hero['name']
+
+
+def test_create_heroes_bulk_is_all_or_nothing(session: Session, client: TestClient):
+    session.execute(text(
+        "CREATE TRIGGER reject_boom BEFORE INSERT ON hero WHEN NEW.name = 'Boom' "
+        "BEGIN SELECT RAISE(ABORT, 'no Boom allowed'); END"
+    ))
+    session.commit()
+
+    heroes = [{'name': name, 'secret_name': 'Secret'} for name in ('Deadpond', 'Rusty-Man', 'Boom')]
+    with pytest.raises(Exception):
+        client.post('/heroes/bulk', params={'batch_size': 2}, json=heroes)
+
+    assert session.exec(select(Hero)).all() == []
+
+
+def test_create_teams_bulk(session: Session, client: TestClient):
+    teams = [{'name': 'Preventers', 'headquarters': 'Sharp Tower'}, {'name': 'Z-Force', 'headquarters': 'Sister Margaret’s Bar'}]
+    response = client.post('/teams/bulk', json=teams)
+
+    assert response.status_code == 200
+    assert [session.get(Team, team_id).name for team_id in response.json()] == ['Preventers', 'Z-Force']
+
+
+def create_team_with_heroes(session: Session, size: int = 3) -> Team:
+    team = Team(name='Preventers', headquarters='Sharp Tower')
+    team.heroes = [Hero(name=f'Hero {i}', secret_name=f'Secret {i}') for i in range(size)]
+    session.add(team)
+    session.commit()
+    team_id = team.id
+    session.expunge_all()
+    return team_id
+
+
+def test_read_team_loads_heroes_up_front(engine, session: Session, client: TestClient):
+    team_id = create_team_with_heroes(session, size=5)
+
+    with count_statements(engine) as statements, record_lazy_loads(session) as lazy_loads:
+        response = client.get(f'/teams/{team_id}')
+
+    assert response.status_code == 200
+    assert len(response.json()['heroes']) == 5
+    assert lazy_loads == []
+    # One SELECT for the team and one selectin load for all of its heroes.
+    assert len(statements) == 2
+
+
+def test_read_hero_loads_team_up_front(engine, session: Session, client: TestClient):
+    create_team_with_heroes(session)
+    hero = session.exec(select(Hero)).first()
+    session.expunge_all()
+
+    with count_statements(engine) as statements, record_lazy_loads(session) as lazy_loads:
+        response = client.get(f'/heroes/{hero.id}')
+
+    assert response.status_code == 200
+    assert response.json()['team']['name'] == 'Preventers'
+    assert lazy_loads == []
+    assert len(statements) == 1
+
+
+def test_read_hero_is_served_from_cache(engine, session: Session, client: TestClient):
+    create_team_with_heroes(session)
+    hero = session.exec(select(Hero)).first()
+    first = client.get(f'/heroes/{hero.id}')
+
+    with count_statements(engine) as statements:
+        second = client.get(f'/heroes/{hero.id}')
+
+    assert second.json() == first.json()
+    assert statements == []
+    stats = client.get('/cache/stats').json()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+
+def test_cache_is_invalidated_by_writes(session: Session, client: TestClient):
+    team_id = create_team_with_heroes(session, size=1)
+    hero = session.exec(select(Hero)).first()
+    other_team = client.post('/teams/', json={'name': 'Z-Force', 'headquarters': 'Sister Margaret’s Bar'}).json()
+    assert client.get(f'/heroes/{hero.id}').json()['team']['name'] == 'Preventers'
+    assert len(client.get(f'/teams/{team_id}').json()['heroes']) == 1
+    assert client.get(f"/teams/{other_team['id']}").json()['heroes'] == []
+
+    # Renaming the team drops the cached hero that embeds it.
+    client.patch(f'/teams/{team_id}', json={'name': 'Avengers'})
+    assert client.get(f'/heroes/{hero.id}').json()['team']['name'] == 'Avengers'
+
+    # Moving the hero drops both the team it left and the team it joined.
+    client.patch(f'/heroes/{hero.id}', json={'team_id': other_team['id']})
+    assert client.get(f'/teams/{team_id}').json()['heroes'] == []
+    assert [h['name'] for h in client.get(f"/teams/{other_team['id']}").json()['heroes']] == [hero.name]
+
+    client.delete(f'/heroes/{hero.id}')
+    assert client.get(f'/heroes/{hero.id}').status_code == 404
+    assert client.get(f"/teams/{other_team['id']}").json()['heroes'] == []
+
+
+def test_export_heroes(session: Session, client: TestClient):
+    team_id = create_team_with_heroes(session, size=3)
+    session.add(Hero(name='Dr. Weird', secret_name='Steve Weird', age=36))
+    session.commit()
+
+    response = client.get('/heroes/export', params={'batch_size': 2})
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row['name'] for row in rows] == ['Hero 0', 'Hero 1', 'Hero 2', 'Dr. Weird']
+    assert set(rows[0]) == {'id', 'name', 'secret_name', 'age', 'team_id'}
+
+    response = client.get('/heroes/export', params={'fields': 'id,name', 'team_id': team_id})
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == [{'id': 1, 'name': 'Hero 0'}, {'id': 2, 'name': 'Hero 1'}, {'id': 3, 'name': 'Hero 2'}]
+
+    response = client.get('/heroes/export', params={'min_age': 30})
+    assert [json.loads(line)['name'] for line in response.text.splitlines()] == ['Dr. Weird']
+
+
+def test_export_unknown_field(client: TestClient):
+    response = client.get('/teams/export', params={'fields': 'id,password'})
+    assert response.status_code == 400
+
+
+def test_create_hero_is_a_single_statement(engine, client: TestClient):
+    with count_statements(engine) as statements:
+        response = client.post('/heroes/', json={'name': 'Deadpond', 'secret_name': 'Dive Wilson'})
+
+    assert response.json() == {'id': 1, 'name': 'Deadpond', 'secret_name': 'Dive Wilson', 'age': None, 'team_id': None}
+    assert len(statements) == 1
+    assert statements[0].startswith('INSERT INTO hero')
+
+
+@pytest.mark.parametrize('path', ['/heroes/', '/heroes/1', '/teams/', '/teams/1'])
+def test_fast_responses_match_validated_responses(session: Session, client: TestClient, monkeypatch, path):
+    create_team_with_heroes(session, size=3)
+    fast = client.get(path, params={'limit': 2} if path.endswith('/') else None)
+
+    monkeypatch.setattr(app_module, 'fast_responses', False)
+    entity_cache.clear()
+    validated = client.get(path, params={'limit': 2} if path.endswith('/') else None)
+
+    assert fast.status_code == validated.status_code == 200
+    assert fast.json() == validated.json()
+    assert fast.headers.get('X-Next-Cursor') == validated.headers.get('X-Next-Cursor')
+
+
+@contextmanager
+def record_instance_loads():
+    loaded = []
+
+    def load(target, context):
+        loaded.append(target)
+
+    for model in (Hero, Team):
+        event.listen(model, 'load', load)
+    try:
+        yield loaded
+    finally:
+        for model in (Hero, Team):
+            event.remove(model, 'load', load)
+
+
+@pytest.mark.parametrize('path', ['/heroes/', '/heroes/?team_id=1&headquarters=Sharp Tower', '/teams/'])
+def test_list_rows_match_entities(session: Session, client: TestClient, monkeypatch, path):
+    create_team_with_heroes(session, size=3)
+    with record_instance_loads() as loaded:
+        rows = client.get(path, params={'limit': 2})
+    # Plain rows: no ORM instance is built.
+    assert loaded == []
+
+    monkeypatch.setattr(app_module, 'list_rows', False)
+    with record_instance_loads() as loaded:
+        entities = client.get(path, params={'limit': 2})
+    assert loaded
+
+    assert rows.status_code == entities.status_code == 200
+    assert rows.json()
+    assert rows.json() == entities.json()
+    assert rows.headers['ETag'] == entities.headers['ETag']
+    assert rows.headers.get('X-Next-Cursor') == entities.headers.get('X-Next-Cursor')
+
+
+def test_sql_metrics(session: Session, client: TestClient):
+    team_id = create_team_with_heroes(session, size=3)
+    route = 'route="GET /teams/{team_id}"'
+
+    def requests_seen():
+        for line in client.get('/metrics').text.splitlines():
+            if line.startswith(f'db_statements_per_request_count{{{route}}}'):
+                return int(line.split()[-1])
+        return 0
+
+    before = requests_seen()
+    response = client.get(f'/teams/{team_id}')
+
+    assert response.headers['X-DB-Queries'] == '2'
+    assert response.headers['X-DB-Rows'] == '4'  # the team, then its three heroes
+    assert float(response.headers['X-DB-Time-ms']) > 0
+    assert requests_seen() == before + 1
+
+
+def test_canonical_queries_use_indexes(engine):
+    assert find_scans(engine, CANONICAL_QUERIES) == {}
+
+
+def test_ensure_indexes_on_existing_tables(engine):
+    with engine.begin() as conn:
+        conn.execute(text('DROP INDEX ix_hero_team_id_age'))
+        conn.execute(text('CREATE INDEX ix_hero_secret_name ON hero (secret_name)'))
+    assert 'team heroes' in find_scans(engine, CANONICAL_QUERIES)
+
+    ensure_indexes(engine, AppModel.metadata)
+
+    assert find_scans(engine, CANONICAL_QUERIES) == {}
+    assert undeclared_indexes(engine, AppModel.metadata) == {'hero': ['ix_hero_secret_name']}
+
+
+HERO_FILTERS = {
+    'min_age': 30,
+    'max_age': 40,
+    'name_prefix': 'Dead',
+    'team_id': 1,
+    'headquarters': 'Aqua World',
+}
+
+
+# The first page of read_heroes() is paged from FIRST_ID too (see page_params()).
+@pytest.mark.parametrize('after', [encode_cursor(FIRST_ID), encode_cursor(10)])
+@pytest.mark.parametrize(
+    'names', [names for size in range(1, len(HERO_FILTERS) + 1) for names in combinations(HERO_FILTERS, size)], ids='-'.join
+)
+def test_hero_filters_use_indexes(engine, names, after):
+    filters = {name: HERO_FILTERS[name] for name in names}
+    statement = paginate(filter_heroes(select(Hero), **filters), Hero.id, after=after, limit=100)
+    # A one-sided age range can be read in id order from the cursor (SEARCH hero USING INTEGER
+    # PRIMARY KEY), stopping at the page limit, rather than searched and sorted.
+    assert find_scans(engine, {'filtered heroes': statement}) == {}
+
+
+def test_read_heroes_filters(session: Session, client: TestClient):
+    aqua = Team(name='Sharks', headquarters='Aqua World')
+    tower = Team(name='Preventers', headquarters='Sharp Tower')
+    session.add_all([
+        Hero(name='Deadpond', secret_name='Dive Wilson', age=30, team=aqua),
+        Hero(name='Deadlock', secret_name='Unknown', age=48, team=tower),
+        Hero(name='Rusty-Man', secret_name='Tommy Sharp', age=35, team=tower),
+        Hero(name='Spider-Boy', secret_name='Pedro Parqueador'),
+    ])
+    session.commit()
+
+    def names(**params):
+        response = client.get('/heroes/', params=params)
+        assert response.status_code == 200
+        return [hero['name'] for hero in response.json()]
+
+    assert names(name_prefix='Dead') == ['Deadpond', 'Deadlock']
+    assert names(name_prefix='dead') == []
+    assert names(min_age=35) == ['Deadlock', 'Rusty-Man']
+    assert names(max_age=35) == ['Deadpond', 'Rusty-Man']
+    assert names(min_age=31, max_age=40) == ['Rusty-Man']
+    assert names(team_id=tower.id, min_age=40) == ['Deadlock']
+    assert names(headquarters='Sharp Tower', name_prefix='Dead') == ['Deadlock']
+    assert names(headquarters='Aqua World', limit=1) == ['Deadpond']
+    # Prefixes whose last character has no successor, or whose successor is a surrogate.
+    assert names(name_prefix='Dead\U0010ffff') == []
+    assert names(name_prefix='\U0010ffff') == []
+    assert names(name_prefix='\ud7ff') == []
+    assert client.get('/heroes/export', params={'name_prefix': 'Dead\U0010ffff'}).status_code == 200
+    assert client.get('/heroes/', params={'name_prefix': 'Dead', 'after': 'not a cursor'}).status_code == 400
+
+
+def test_reads_and_writes_use_separate_engines(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'database.db'}"
+    write_engine = create_db_engine(url, poolclass=QueuePool, pool_size=1, max_overflow=0)
+    read_engine = create_db_engine(url, read_only=True, poolclass=QueuePool, pool_size=2)
+    AppModel.metadata.create_all(write_engine)
+    monkeypatch.setattr(app_module, 'write_engine', write_engine)
+    monkeypatch.setattr(app_module, 'read_engine', read_engine)
+    entity_cache.clear()
+    client = TestClient(app)
+
+    with count_statements(write_engine) as writes, count_statements(read_engine) as reads:
+        hero_id = client.post('/heroes/', json={'name': 'Deadpond', 'secret_name': 'Dive Wilson'}).json()['id']
+        assert client.get(f'/heroes/{hero_id}').json()['name'] == 'Deadpond'
+        assert client.get('/heroes/').json()[0]['id'] == hero_id
+        assert client.patch(f'/heroes/{hero_id}', json={'age': 30}).status_code == 200
+
+    assert [statement.split()[0] for statement in writes] == ['INSERT', 'SELECT', 'UPDATE']
+    assert [statement.split()[0] for statement in reads] == ['SELECT', 'SELECT']
+
+    stats = client.get('/pool/stats').json()
+    assert stats['read'] == {'pool': 'QueuePool', 'size': 2, 'checked_in': 1, 'checked_out': 0, 'overflow': -1}
+    assert stats['write'] == {'pool': 'QueuePool', 'size': 1, 'checked_in': 1, 'checked_out': 0, 'overflow': 0}
+
+
+def test_team_stats_follow_hero_writes(engine, session: Session, client: TestClient):
+    preventers = client.post('/teams/', json={'name': 'Preventers', 'headquarters': 'Sharp Tower'}).json()['id']
+    z_force = client.post('/teams/', json={'name': 'Z-Force', 'headquarters': "Sister Margaret's Bar"}).json()['id']
+    rusty_man = client.post(
+        '/heroes/', json={'name': 'Rusty-Man', 'secret_name': 'Tommy Sharp', 'age': 48, 'team_id': preventers}
+    ).json()['id']
+    deadpond, spider_boy, _ = client.post('/heroes/bulk', json=[
+        {'name': 'Deadpond', 'secret_name': 'Dive Wilson', 'team_id': preventers},
+        {'name': 'Spider-Boy', 'secret_name': 'Pedro Parqueador', 'age': 16, 'team_id': preventers},
+        {'name': 'Black Lion', 'secret_name': 'Trevor Challa', 'age': 35, 'team_id': z_force},
+    ]).json()
+    client.patch(f'/heroes/{deadpond}', json={'age': 30})
+    client.patch(f'/heroes/{spider_boy}', json={'team_id': z_force})
+    client.delete(f'/heroes/{rusty_man}')
+
+    assert client.get(f'/teams/{preventers}/stats').json() == {
+        'team_id': preventers, 'hero_count': 1, 'average_age': 30.0, 'min_age': 30, 'max_age': 30
+    }
+    assert client.get(f'/teams/{z_force}/stats').json() == {
+        'team_id': z_force, 'hero_count': 2, 'average_age': 25.5, 'min_age': 16, 'max_age': 35
+    }
+    maintained = session.exec(select(TeamStats).order_by(TeamStats.team_id)).all()
+    maintained = [stats.dict() for stats in maintained]
+    assert recompute_team_stats(session) == 2
+    assert [stats.dict() for stats in session.exec(select(TeamStats).order_by(TeamStats.team_id))] == maintained
+
+    client.delete(f'/teams/{preventers}')
+    assert client.get(f'/teams/{preventers}/stats').status_code == 404
+
+
+def test_delete_team_detaches_heroes_in_one_statement(engine, session: Session, client: TestClient):
+    team_id = create_team_with_heroes(session, size=50)
+    other_team_id = create_team_with_heroes(session, size=2)
+    list_etag = client.get('/heroes/').headers['ETag']
+
+    with count_statements(engine) as statements:
+        response = client.delete(f'/teams/{team_id}')
+    assert response.json() == {'ok': True}
+    # However many heroes the team has: no SELECT, one UPDATE for all of them.
+    assert [statement.split()[0] for statement in statements] == ['UPDATE', 'DELETE', 'DELETE']
+
+    assert len(session.exec(select(Hero).where(Hero.team_id == None)).all()) == 50  # noqa: E711
+    assert len(session.get(Team, other_team_id).heroes) == 2
+    assert session.get(Team, team_id) is None
+    assert client.get('/heroes/').headers['ETag'] != list_etag
+    assert client.delete(f'/teams/{team_id}').status_code == 404
+
+
+def test_read_teams_stats(engine, session: Session, client: TestClient):
+    team_ids = [create_team_with_heroes(session, size) for size in (3, 0, 5)]
+    # The heroes were added through the ORM, not the endpoints that keep the stats.
+    recompute_team_stats(session)
+    session.commit()
+
+    with count_statements(engine) as statements:
+        response = client.get('/teams/stats', params={'limit': 2})
+    assert len(statements) == 1
+    assert [stats['hero_count'] for stats in response.json()] == [3, 0]
+    assert response.json()[1] == {'team_id': team_ids[1], 'hero_count': 0, 'average_age': None, 'min_age': None, 'max_age': None}
+
+    response = client.get('/teams/stats', params={'after': response.headers['X-Next-Cursor']})
+    assert [stats['team_id'] for stats in response.json()] == [team_ids[2]]
+
+
+def test_create_maintained_tables_fills_an_existing_database(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    AppModel.metadata.create_all(engine, tables=[Team.__table__, Hero.__table__])
+    with Session(engine) as session:
+        team_id = create_team_with_heroes(session, 4)
+
+    create_maintained_tables(engine)
+
+    with Session(engine) as session:
+        assert session.get(TeamStats, team_id).hero_count == 4
+        assert read_row_count(session, Hero) == 4
+        assert read_row_count(session, Team) == 1
+
+
+def test_update_heroes_batch(engine, session: Session, client: TestClient):
+    preventers = client.post('/teams/', json={'name': 'Preventers', 'headquarters': 'Sharp Tower'}).json()['id']
+    z_force = client.post('/teams/', json={'name': 'Z-Force', 'headquarters': "Sister Margaret's Bar"}).json()['id']
+    ids = client.post('/heroes/bulk', json=[
+        {'name': f'Hero {i}', 'secret_name': f'Secret {i}', 'age': 20 + i, 'team_id': preventers} for i in range(5)
+    ]).json()
+    client.get(f'/heroes/{ids[0]}')
+
+    with count_statements(engine) as statements:
+        response = client.patch('/heroes/', json=[
+            {'id': ids[0], 'team_id': z_force},
+            {'id': ids[1], 'team_id': z_force},
+            {'id': 9999, 'age': 1},
+            {'id': ids[2], 'age': 40},
+            {'id': ids[3], 'age': 41},
+            # Merged with the first update of the same hero.
+            {'id': ids[0], 'age': 50},
+        ])
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {'id': ids[0], 'ok': True, 'detail': None},
+        {'id': ids[1], 'ok': True, 'detail': None},
+        {'id': 9999, 'ok': False, 'detail': 'Hero not found!'},
+        {'id': ids[2], 'ok': True, 'detail': None},
+        {'id': ids[3], 'ok': True, 'detail': None},
+    ]
+    # The hero lookup, one UPDATE per set of columns ((age, team_id), (team_id) and (age)), a stats upsert
+    # per team, then the hero and the team versions.
+    assert [statement.split()[0] for statement in statements] == [
+        'SELECT', 'UPDATE', 'UPDATE', 'UPDATE', 'INSERT', 'INSERT', 'UPDATE', 'UPDATE'
+    ]
+
+    heroes = {hero.id: hero for hero in session.exec(select(Hero))}
+    assert [(heroes[hero_id].team_id, heroes[hero_id].age) for hero_id in ids] == [
+        (z_force, 50), (z_force, 21), (preventers, 40), (preventers, 41), (preventers, 24)
+    ]
+    assert client.get(f'/heroes/{ids[0]}').json()['team']['id'] == z_force
+    assert client.get(f'/teams/{z_force}/stats').json() == {
+        'team_id': z_force, 'hero_count': 2, 'average_age': 35.5, 'min_age': 21, 'max_age': 50
+    }
+    assert client.get(f'/teams/{preventers}/stats').json()['hero_count'] == 3
+
+
+def test_prebuilt_statements_hit_the_compiled_cache(engine, session: Session, client: TestClient, monkeypatch):
+    cache = track_statement_cache(engine)
+    monkeypatch.setitem(app_module.statement_caches, 'read', cache)
+    team_id = create_team_with_heroes(session, 3)
+    hero_ids = session.exec(select(Hero.id)).all()
+    cache.hits = cache.misses = cache.uncached = 0
+
+    for hero_id in hero_ids:
+        assert client.get(f'/heroes/{hero_id}').status_code == 200
+    for after in (None, encode_cursor(hero_ids[0])):
+        assert client.get('/heroes/', params={'after': after} if after else {}).status_code == 200
+
+    # Compiled once per statement: the hero by id, and the list page with or without a cursor.
+    assert (cache.misses, cache.hits) == (2, 3)
+    assert client.get('/cache/statements').json()['read'] == {
+        'size': len(engine._compiled_cache), 'maxsize': engine._compiled_cache.capacity, 'hits': 3, 'misses': 2, 'uncached': 0
+    }
+    assert client.get(f'/teams/{team_id}').json()['id'] == team_id
+
+
+def test_startup_checks_the_schema_and_warms_up(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'database.db'}"
+    write_engine = create_db_engine(url, poolclass=QueuePool, pool_size=1, max_overflow=0)
+    read_engine = create_db_engine(url, read_only=True, poolclass=QueuePool, pool_size=2)
+    monkeypatch.setattr(app_module, 'write_engine', write_engine)
+    monkeypatch.setattr(app_module, 'read_engine', read_engine)
+    monkeypatch.setattr(app_module, 'startup_timings', {})
+
+    with TestClient(app) as client:
+        client.get('/startup/stats')
+        stats = client.get('/startup/stats').json()
+    assert stats['schema_created'] is True
+    assert stats['warm_up_ms'] is not None
+    assert stats['ready_ms'] > 0 and stats['first_request_ms'] is not None
+    assert pool_stats(read_engine)['checked_in'] == 2
+    assert inspect(read_engine).get_table_names() == ['hero', 'rowcount', 'sqlite_sequence', 'sqlite_stat1', 'team', 'teamstats']
+
+    with count_statements(write_engine) as statements, TestClient(app) as client:
+        assert client.get('/startup/stats').json()['schema_created'] is False
+    assert not [statement for statement in statements if statement.startswith('CREATE')]
+
+
+def test_total_count(engine, client: TestClient):
+    team_id = client.post('/teams/', json={'name': 'Preventers', 'headquarters': 'Sharp Tower'}).json()['id']
+    client.post('/teams/bulk', json=[{'name': f'Team {i}', 'headquarters': 'HQ'} for i in range(2)])
+    hero_id = client.post('/heroes/', json={'name': 'Deadpond', 'secret_name': 'Dive Wilson', 'team_id': team_id}).json()['id']
+    client.post('/heroes/bulk', json=[{'name': f'Hero {i}', 'secret_name': 'Secret', 'age': 20 + i} for i in range(5)])
+    client.delete(f'/heroes/{hero_id}')
+
+    assert 'X-Total-Count' not in client.get('/heroes/').headers
+    with count_statements(engine) as statements:
+        response = client.get('/heroes/', params={'count': True, 'limit': 2})
+    # The maintained counter: one primary key lookup, no COUNT(*) over hero.
+    assert response.headers['X-Total-Count'] == '5'
+    assert len(statements) == 2 and 'FROM rowcount' in statements[1]
+    assert client.get('/teams/', params={'count': True}).headers['X-Total-Count'] == '3'
+
+    # Filtered lists under the exact limit are counted exactly.
+    response = client.get('/heroes/', params={'count': True, 'min_age': 22, 'limit': 2})
+    assert response.headers['X-Total-Count'] == '3'
+    assert 'X-Total-Count-Margin' not in response.headers
+
+
+def test_conditional_get_hero(engine, session: Session, client: TestClient):
+    team_id = create_team_with_heroes(session, 2)
+    hero_id = session.exec(select(Hero.id).where(Hero.team_id == team_id)).first()
+
+    etag = client.get(f'/heroes/{hero_id}').headers['ETag']
+    entity_cache.clear()
+    with count_statements(engine) as statements:
+        response = client.get(f'/heroes/{hero_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert len(statements) == 1 and 'hero.id = ?' in statements[0]
+
+    # From the cached body, without any statement.
+    client.get(f'/heroes/{hero_id}')
+    with count_statements(engine) as statements:
+        assert client.get(f'/heroes/{hero_id}', headers={'If-None-Match': f'W/{etag}'}).status_code == 304
+    assert statements == []
+
+    # The hero embeds its team: a change to either one changes the ETag.
+    etags = {etag}
+    for write in (
+        lambda: client.patch(f'/heroes/{hero_id}', json={'age': 30}),
+        lambda: client.patch(f'/teams/{team_id}', json={'headquarters': 'Sister Margaret’s Bar'}),
+    ):
+        write()
+        entity_cache.clear()
+        response = client.get(f'/heroes/{hero_id}', headers={'If-None-Match': ', '.join(etags)})
+        assert response.status_code == 200
+        assert response.headers['ETag'] not in etags
+        etags.add(response.headers['ETag'])
+    assert client.get('/heroes/9999', headers={'If-None-Match': etag}).status_code == 404
+
+
+def test_conditional_get_team_follows_its_heroes(session: Session, client: TestClient):
+    team_id = create_team_with_heroes(session, 2)
+    hero_id = session.exec(select(Hero.id).where(Hero.team_id == team_id)).first()
+    etags = [client.get(f'/teams/{team_id}').headers['ETag']]
+    assert client.get(f'/teams/{team_id}', headers={'If-None-Match': etags[0]}).status_code == 304
+
+    for write in (
+        lambda: client.post('/heroes/', json={'name': 'Deadpond', 'secret_name': 'Dive Wilson', 'team_id': team_id}),
+        lambda: client.patch(f'/heroes/{hero_id}', json={'name': 'Renamed'}),
+        lambda: client.patch('/heroes/', json=[{'id': hero_id, 'age': 30}]),
+        lambda: client.delete(f'/heroes/{hero_id}'),
+    ):
+        write()
+        response = client.get(f'/teams/{team_id}', headers={'If-None-Match': etags[-1]})
+        assert response.status_code == 200
+        etags.append(response.headers['ETag'])
+    assert len(set(etags)) == len(etags)
+
+
+@pytest.mark.parametrize('path', ['/teams/', '/heroes/'])
+def test_etags_of_deleted_rows_are_not_reused(client: TestClient, path):
+    body = {'name': 'Preventers', 'headquarters': 'Sharp Tower'} if path == '/teams/' else {'name': 'Deadpond', 'secret_name': 'Dive Wilson'}
+    row_id = client.post(path, json=body).json()['id']
+    etag = client.get(f'{path}{row_id}').headers['ETag']
+    list_etag = client.get(path).headers['ETag']
+    client.delete(f'{path}{row_id}')
+
+    new_id = client.post(path, json=body).json()['id']
+    assert new_id != row_id
+    assert client.get(f'{path}{row_id}', headers={'If-None-Match': etag}).status_code == 404
+    assert client.get(path, headers={'If-None-Match': list_etag}).status_code == 200
+
+
+def test_concurrent_updates_get_distinct_versions(tmp_path):
+    # Two workers on one database file, both read the row before either writes.
+    url = f"sqlite:///{tmp_path / 'database.db'}"
+    engine, other_engine = create_db_engine(url), create_db_engine(url)
+    with engine.begin() as conn:
+        app_module.create_tables(conn)
+    with Session(engine) as session:
+        team, hero = Team(name='Preventers', headquarters='Sharp Tower'), Hero(name='Deadpond', secret_name='Dive Wilson')
+        session.add_all([team, hero])
+        session.commit()
+        team_id, hero_id = team.id, hero.id
+
+    # validate() like FastAPI: SQLModel's constructor marks every field as set.
+    def hero_update(**body):
+        return HeroUpdate.validate(body)
+
+    def team_update(**body):
+        return TeamUpdate.validate(body)
+
+    with Session(engine) as session, Session(other_engine) as other_session:
+        # Held on to: the identity map would otherwise drop them and the updates read again.
+        heroes = session.get(Hero, hero_id), other_session.get(Hero, hero_id)
+        app_module.apply_hero_update(session, hero_id, hero_update(age=30))
+        session.commit()
+        app_module.apply_hero_update(other_session, hero_id, hero_update(name='Deadpool'))
+        other_session.commit()
+
+        teams = session.get(Team, team_id), other_session.get(Team, team_id)
+        app_module.update_team(session=session, team_id=team_id, team=team_update(name='Avengers'))
+        app_module.update_team(session=other_session, team_id=team_id, team=team_update(headquarters='Tower'))
+
+    with Session(engine) as session:
+        assert session.get(Hero, hero_id).version == 3
+        assert session.get(Team, team_id).version == 3
+
+
+def test_create_tables_adds_autoincrement_to_an_existing_database(tmp_path, monkeypatch):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    with engine.begin() as conn:
+        for table in (Team.__table__, Hero.__table__):
+            # The tables as they were created before sqlite_autoincrement.
+            conn.exec_driver_sql(str(CreateTable(table).compile(dialect=conn.dialect)).replace(' AUTOINCREMENT', ''))
+        conn.exec_driver_sql("INSERT INTO team (name, headquarters) VALUES ('Preventers', 'Sharp Tower')")
+        conn.exec_driver_sql("INSERT INTO hero (name, secret_name, team_id) VALUES ('Deadpond', 'Dive Wilson', 1)")
+        app_module.create_tables(conn)
+
+    with Session(engine) as session:
+        assert read_row_count(session, Team) == 1
+        for _ in range(2):
+            team = Team(name='Z-Force', headquarters='Bar')
+            session.add(team)
+            session.commit()
+            team_id = team.id
+            session.delete(team)
+            session.commit()
+        assert team_id == 3
+        assert read_row_count(session, Team) == 1
+        assert session.exec(select(Hero.name)).all() == ['Deadpond']
+    assert find_scans(engine, CANONICAL_QUERIES) == {}
+
+
+@pytest.mark.parametrize('path', ['/heroes/', '/teams/'])
+def test_conditional_get_collection(session: Session, client: TestClient, path):
+    team_id = create_team_with_heroes(session, 3)
+    response = client.get(path, params={'limit': 2})
+    etag = response.headers['ETag']
+
+    not_modified = client.get(path, params={'limit': 2}, headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers.get('X-Next-Cursor') == response.headers.get('X-Next-Cursor')
+
+    client.patch(f'/teams/{team_id}', json={'name': 'Renamed'})
+    client.patch(f'/heroes/{response.json()[0]["id"]}', json={'name': 'Renamed'})
+    assert client.get(path, params={'limit': 2}, headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_coalesced_writes(tmp_path, monkeypatch):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    AppModel.metadata.create_all(engine)
+    coalescer = WriteCoalescer(engine)
+    monkeypatch.setattr(app_module, 'write_coalescer', coalescer)
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    entity_cache.clear()
+    coalescer.start()
+    try:
+        client = TestClient(app)
+        team_id = client.post('/teams/', json={'name': 'Preventers', 'headquarters': 'Sharp Tower'}).json()['id']
+        hero = client.post('/heroes/', json={'name': 'Deadpond', 'secret_name': 'Dive Wilson', 'team_id': team_id}).json()
+        updated = client.patch(f"/heroes/{hero['id']}", json={'age': 30})
+        missing = client.patch('/heroes/9999', json={'age': 30})
+        stats = client.get(f'/teams/{team_id}/stats').json()
+        metrics = client.get('/metrics').text
+    finally:
+        coalescer.stop()
+        app.dependency_overrides.clear()
+
+    assert updated.json() == {**hero, 'age': 30}
+    assert missing.status_code == 404
+    assert stats['hero_count'] == 1
+    # The create and both updates, the team isn't created through the coalescer.
+    assert 'write_batch_size_count{queue="writes"} 3' in metrics
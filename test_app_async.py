@@ -0,0 +1,66 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app_async import app, get_session
+from models import AppModel
+
+
+@pytest.fixture(name='client')
+def client_fixture(tmp_path):
+    # TestClient runs every request on a new event loop, so the tests use a file database
+    # and a fresh aiosqlite connection per session rather than a shared in-memory one.
+    sqlite_file_name = tmp_path / 'database.db'
+    AppModel.metadata.create_all(create_engine(f'sqlite:///{sqlite_file_name}'))
+    engine = create_async_engine(f'sqlite+aiosqlite:///{sqlite_file_name}')
+
+    async def get_session_override():
+        async with AsyncSession(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    client = TestClient(app)
+    yield client
+    app.dependency_overrides.clear()
+
+
+def test_hero_crud(client: TestClient):
+    team = client.post('/teams/', json={'name': 'Preventers', 'headquarters': 'Sharp Tower'}).json()
+    response = client.post('/heroes/', json={'name': 'Deadpond', 'secret_name': 'Dive Wilson', 'team_id': team['id']})
+    hero = response.json()
+    assert response.status_code == 200
+    assert hero['id'] is not None
+
+    response = client.get(f"/heroes/{hero['id']}")
+    assert response.status_code == 200
+    assert response.json()['team'] == team
+
+    response = client.patch(f"/heroes/{hero['id']}", json={'age': 30})
+    assert response.status_code == 200
+    assert response.json()['age'] == 30
+
+    response = client.delete(f"/heroes/{hero['id']}")
+    assert response.status_code == 200
+    assert client.get(f"/heroes/{hero['id']}").status_code == 404
+
+
+def test_team_crud(client: TestClient):
+    team = client.post('/teams/', json={'name': 'Preventers', 'headquarters': 'Sharp Tower'}).json()
+    client.post('/heroes/', json={'name': 'Rusty-Man', 'secret_name': 'Tommy Sharp', 'team_id': team['id']})
+
+    response = client.get(f"/teams/{team['id']}")
+    assert response.status_code == 200
+    assert [hero['name'] for hero in response.json()['heroes']] == ['Rusty-Man']
+
+    response = client.patch(f"/teams/{team['id']}", json={'headquarters': 'Aqua World'})
+    assert response.json()['headquarters'] == 'Aqua World'
+
+    response = client.get('/teams/', params={'limit': 1, 'count': True})
+    assert len(response.json()) == 1
+    assert 'X-Next-Cursor' in response.headers
+    assert response.headers['X-Total-Count'] == '1'
+
+    assert client.delete(f"/teams/{team['id']}").json() == {'ok': True}
+    assert client.get(f"/teams/{team['id']}").status_code == 404